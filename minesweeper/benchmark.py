@@ -0,0 +1,108 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+# Standard board sizes, as (height, width, mines)
+BOARDS = {
+    "beginner": (8, 8, 10),
+    "intermediate": (16, 16, 40),
+    "expert": (16, 30, 99),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Minesweeper AI on simulated games."
+    )
+    parser.add_argument("--boards", nargs="+", choices=BOARDS, default=list(BOARDS))
+    parser.add_argument("--games", type=int, default=100, help="games per board")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write JSON results to")
+    args = parser.parse_args()
+
+    results = []
+    for board in args.boards:
+        height, width, mines = BOARDS[board]
+        result = benchmark(height, width, mines, args.games, args.seed)
+        result.update(board=board, height=height, width=width, mines=mines)
+        print(f"{board}: {result['seconds']:.3f}s", file=sys.stderr)
+        results.append(result)
+
+    report = {"games": args.games, "seed": args.seed, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+def benchmark(height, width, mines, games, seed):
+    """
+    Play `games` games on boards of the given size, and return the
+    number won, the AI's total counters, and statistics of the time
+    taken by each click.
+    """
+    random.seed(seed)
+    wins = 0
+    counters = dict()
+    timings = []
+
+    start = time.perf_counter()
+    for _ in range(games):
+        game = Minesweeper(height, width, mines)
+        ai = MinesweeperAI(height, width, neighbors=game.neighbors)
+        wins += play(game, ai)
+        for name, value in ai.counters.items():
+            counters[name] = counters.get(name, 0) + value
+        timings.extend(ai.timings)
+    seconds = time.perf_counter() - start
+
+    return {
+        "seconds": seconds,
+        "wins": wins,
+        "counters": counters,
+        "click_timings": summarize(timings),
+    }
+
+
+def play(game, ai):
+    """
+    Let `ai` play `game`, making safe moves when it knows of any and
+    random moves otherwise, and return whether it found every mine
+    without clicking on one.
+    """
+    while True:
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_random_move()
+        if move is None:
+            return ai.mines == game.mines
+        if game.is_mine(move):
+            return False
+        ai.add_knowledge(move, game.nearby_mines(move))
+
+
+def summarize(timings):
+    """
+    Return the mean, median, 99th percentile and maximum of
+    `timings`, a list of seconds, in milliseconds.
+    """
+    if len(timings) == 0:
+        return {}
+    ordered = sorted(timings)
+    return {
+        "mean_ms": 1000 * statistics.fmean(ordered),
+        "p50_ms": 1000 * ordered[len(ordered) // 2],
+        "p99_ms": 1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "max_ms": 1000 * ordered[-1],
+    }
+
+
+if __name__ == "__main__":
+    main()
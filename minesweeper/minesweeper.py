@@ -1,5 +1,15 @@
+import functools
 import itertools
+import logging
 import random
+import time
+
+from collections import deque
+
+import numpy as np
+
+# Number of board sizes whose neighbor tables are kept cached
+NEIGHBOR_CACHE_SIZE = 8
 
 
 class Minesweeper():
@@ -15,20 +25,20 @@ class Minesweeper():
         self.mines = set()
 
         # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        self.board = np.zeros((height, width), dtype=bool)
 
         # Add mines randomly
         while len(self.mines) != mines:
             i = random.randrange(height)
             j = random.randrange(width)
-            if not self.board[i][j]:
+            if not self.board[i, j]:
                 self.mines.add((i, j))
-                self.board[i][j] = True
+                self.board[i, j] = True
+
+        # Count the mines next to every cell once, and share the
+        # neighbors of each cell with any AI for the same board size
+        self.counts = neighbor_counts(self.board)
+        self.neighbors = neighbor_table(height, width)
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -41,7 +51,7 @@ class Minesweeper():
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if self.is_mine((i, j)):
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -50,7 +60,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return bool(self.board[i, j])
 
     def nearby_mines(self, cell):
         """
@@ -58,24 +68,8 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        i, j = cell
+        return int(self.counts[i, j])
 
     def won(self):
         """
@@ -84,29 +78,135 @@ class Minesweeper():
         return self.mines_found == self.mines
 
 
+def neighbor_counts(board):
+    """
+    Returns an array of the number of mines next to each cell, given
+    a boolean array `board` of where the mines are.
+
+    This is the convolution of `board` with a 3 by 3 kernel of ones
+    and a zero in the middle, computed as a sum of shifted copies.
+    """
+    height, width = board.shape
+    padded = np.pad(board.astype(np.int8), 1)
+    counts = -board.astype(np.int8)
+    for di in range(3):
+        for dj in range(3):
+            counts += padded[di:di + height, dj:dj + width]
+    return counts
+
+
+@functools.lru_cache(maxsize=NEIGHBOR_CACHE_SIZE)
+def neighbor_table(height, width):
+    """
+    Returns a list of `neighbor_mask(height, width, index)` for the
+    index of every cell on a board of `height` by `width` cells.
+
+    Tables are cached for the `NEIGHBOR_CACHE_SIZE` most recently used
+    board sizes, and masks that are equal are shared.
+    """
+    masks = dict()
+    table = []
+    for index in range(height * width):
+        mask, offset = neighbor_mask(height, width, index)
+        table.append((masks.setdefault(mask, mask), offset))
+    return table
+
+
+def neighbor_mask(height, width, index):
+    """
+    Returns the cells within one row and column of the cell with
+    index `index`, on a board of `height` by `width` cells, not
+    including the cell itself, as a tuple `(mask, offset)` where the
+    bitset of the cells is `mask << offset`.
+    """
+    row, col = divmod(index, width)
+    top = max(0, row - 1)
+    left = max(0, col - 1)
+    span = ((1 << (min(col + 2, width) - left)) - 1) << left
+
+    # Keep the mask relative to the top row, since operations on
+    # bitsets of the whole board are slow on large boards
+    mask = 0
+    for r in range(min(row + 2, height) - top):
+        mask |= span << (r * width)
+    return mask ^ 1 << (index - top * width), top * width
+
+
+def cell_indices(bits):
+    """
+    Yields the index of each cell in the bitset `bits`,
+    in increasing order.
+    """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
 class Sentence():
     """
     Logical statement about a Minesweeper game
-    A sentence consists of a set of board cells,
-    and a count of the number of those cells which are mines.
+    A sentence consists of a set of board cells, as a bitset of
+    cell indices, and a count of the number of those cells which
+    are mines.
+
+    The bitset is stored shifted down to the sentence's lowest cell,
+    so the cells are `cells << offset`. This keeps sentences small
+    integers on large boards.
     """
 
-    def __init__(self, cells, count):
-        self.cells = set(cells)
+    def __init__(self, cells, count, offset=0):
+        self.cells, self.offset = self._normalize(cells, offset)
         self.count = count
 
+    @staticmethod
+    def _normalize(cells, offset):
+        """
+        Returns the bitset `cells << offset` shifted down to its lowest
+        cell, as a tuple `(cells, offset)`.
+        """
+        if cells:
+            low = (cells & -cells).bit_length() - 1
+            return cells >> low, offset + low
+        return 0, 0
+
     def __eq__(self, other):
-        return self.cells == other.cells and self.count == other.count
+        return self.key() == other.key()
 
     def __str__(self):
-        return f"{self.cells} = {self.count}"
+        return f"{list(self.indices())} = {self.count}"
+
+    def key(self):
+        """
+        Returns a hashable, frozen copy of the sentence,
+        as a tuple of its offset, cells and count.
+        """
+        return self.offset, self.cells, self.count
+
+    def indices(self):
+        """
+        Yields the index of each cell in the sentence.
+        """
+        for index in cell_indices(self.cells):
+            yield self.offset + index
+
+    def align(self, other):
+        """
+        Returns the cells of this sentence and of sentence `other` as
+        bitsets with the same offset, and the offset, as a tuple
+        `(cells, other_cells, offset)`.
+        """
+        shift = other.offset - self.offset
+        if shift >= 0:
+            return self.cells, other.cells << shift, self.offset
+        return self.cells << -shift, other.cells, other.offset
 
     def known_mines(self):
         """
         Returns the set of all cells in self.cells known to be mines.
         """
-        if self.count == len(self.cells):
-            return self.cells
+        if self.count == self.cells.bit_count():
+            return set(self.indices())
         return set()
         raise NotImplementedError
 
@@ -115,17 +215,16 @@ class Sentence():
         Returns the set of all cells in self.cells known to be safe.
         """
         if self.count == 0:
-            return self.cells
+            return set(self.indices())
         return set()
         raise NotImplementedError
 
     def mark_mine(self, cell):
         """
         Updates internal knowledge representation given the fact that
-        a cell is known to be a mine.
+        the cell with index `cell` is known to be a mine.
         """
-        if cell in self.cells:
-            self.cells.remove(cell)
+        if self.remove(cell):
             self.count = self.count - 1
         return
         raise NotImplementedError
@@ -133,51 +232,183 @@ class Sentence():
     def mark_safe(self, cell):
         """
         Updates internal knowledge representation given the fact that
-        a cell is known to be safe.
+        the cell with index `cell` is known to be safe.
         """
-        self.cells.discard(cell)
+        self.remove(cell)
         return
         raise NotImplementedError
 
+    def remove(self, cell):
+        """
+        Removes the cell with index `cell` from the sentence, if it is
+        there, and returns whether it was.
+        """
+        bit = cell - self.offset
+        if bit < 0 or not self.cells >> bit & 1:
+            return False
+        self.cells, self.offset = self._normalize(self.cells ^ 1 << bit, self.offset)
+        return True
+
 
 class MinesweeperAI():
     """
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, trace=None, neighbors=None):
+        """
+        Initialize an AI for a board of `height` by `width` cells.
+        `neighbors` is the `neighbor_table` of the board, such as a
+        game's `neighbors`, and is looked up if not given.
+
+        The AI prints nothing. If `trace` is a function, it is called
+        as `trace(event, details)` for each inference event, where
+        `details` is a dictionary:
+            - "click": a move's `cell`, mine `count` and new `sentence`
+            - "derive": the `subset` and `superset` sentences compared,
+              and the `sentence` for their difference
+            - "mine" and "safe": a newly marked `cell`
+            - "random": the `cell` of a random move
+        If `trace` is a `logging.Logger`, events are logged to it at
+        the DEBUG level instead.
+
+        Whether or not `trace` is given, `counters` keeps totals of
+        clicks, sentences added, subset checks and sentences
+        propagated, and `timings` the seconds taken by each call to
+        `add_knowledge`.
+        """
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        if isinstance(trace, logging.Logger):
+            logger = trace
+            trace = lambda event, details: logger.debug("%s %s", event, details)
+        self.trace = trace
+        if neighbors is None:
+            neighbors = neighbor_table(height, width)
+        self.neighbors = neighbors
+        self.counters = {"clicks": 0, "sentences": 0, "subset_checks": 0, "propagations": 0}
+        self.timings = []
+
+        # Cell (i, j) has index i * width + j, and sets of cells are
+        # bitsets of their indices
+        self.all_cells = (1 << (height * width)) - 1
+
         # Keep track of which cells have been clicked on
-        self.moves_made = set()
+        self.move_bits = 0
 
         # Keep track of cells known to be safe or mines
-        self.mines = set()
-        self.safes = set()
+        self.mine_bits = 0
+        self.safe_bits = 0
+
+        # Sentences about the game known to be true, keyed by their
+        # frozen `(cells, count)`, and the keys of the sentences that
+        # include each cell
+        self.knowledge = dict()
+        self.containing = dict()
+
+        # Keys of sentences added or changed since they were last
+        # compared with the rest of the knowledge base
+        self.pending = deque()
+
+    @property
+    def moves_made(self):
+        """
+        The set of cells `(i, j)` that have been clicked on.
+        """
+        return self.cells(self.move_bits)
+
+    @property
+    def mines(self):
+        """
+        The set of cells `(i, j)` known to be mines.
+        """
+        return self.cells(self.mine_bits)
+
+    @property
+    def safes(self):
+        """
+        The set of cells `(i, j)` known to be safe.
+        """
+        return self.cells(self.safe_bits)
+
+    def cell_index(self, cell):
+        """
+        Returns the index of cell `(i, j)`.
+        """
+        i, j = cell
+        return i * self.width + j
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+    def cells(self, bits):
+        """
+        Returns the set of cells `(i, j)` in the bitset `bits`.
+        """
+        return {divmod(index, self.width) for index in cell_indices(bits)}
 
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
-        self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self.mark(self.cell_index(cell), True)
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
         """
-        self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+        self.mark(self.cell_index(cell), False)
+
+    def mark(self, index, mine):
+        """
+        Marks the cell with index `index` as a mine if `mine` is true,
+        or else as safe, in the AI's knowledge and in every sentence
+        that includes it.
+        """
+        if mine:
+            self.mine_bits |= 1 << index
+        else:
+            self.safe_bits |= 1 << index
+        if self.trace is not None:
+            self.trace("mine" if mine else "safe", {"cell": divmod(index, self.width)})
+        for key in list(self.containing.get(index, ())):
+            sentence = self.remove_sentence(key)
+            if mine:
+                sentence.mark_mine(index)
+            else:
+                sentence.mark_safe(index)
+            self.add_sentence(sentence)
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base, and queues it to be
+        propagated, unless it is empty or already known.
+        Returns whether it was added.
+        """
+        key = sentence.key()
+        if sentence.cells == 0 or key in self.knowledge:
+            return False
+        self.knowledge[key] = sentence
+        for index in sentence.indices():
+            self.containing.setdefault(index, set()).add(key)
+        self.pending.append(key)
+        self.counters["sentences"] += 1
+        return True
+
+    def remove_sentence(self, key):
+        """
+        Removes the sentence with frozen `(cells, count)` `key`
+        from the knowledge base, and returns it.
+        """
+        sentence = self.knowledge.pop(key)
+        for index in sentence.indices():
+            keys = self.containing[index]
+            keys.discard(key)
+            if len(keys) == 0:
+                del self.containing[index]
+        return sentence
 
     def add_knowledge(self, cell, count):
         """
@@ -194,120 +425,79 @@ class MinesweeperAI():
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
         """
-        self.moves_made.add(cell)
-        self.mark_safe(cell)
-        neighbors = set()
-        row, col = cell
-        for r in range(max(0, row - 1), min(row + 2, self.height)):
-            for c in range(max(0, col - 1), min(col + 2, self.width)):
-                if (r, c) != cell:
-                    if (r, c) not in self.safes:
-                        neighbors.add((r, c))
-
-        new_sentence = Sentence(neighbors, count)
-        self.knowledge.append(new_sentence)
-
-        print("----------START-----------")
-        for sentence in self.knowledge:
-            print("Knowledge: ", sentence.cells, sentence.count)
-        print("----------END-----------")
-
-        known_mines = new_sentence.known_mines()
-        known_safes = new_sentence.known_safes()
-        print("new sentence: ", new_sentence.cells, new_sentence.count)
-        print("known mines: ", known_mines)
-        print("known safes: ", known_safes)
-
-        for cell in known_mines.copy():
-            self.mark_mine(cell)
-        for cell in self.mines:
-            self.mark_mine(cell)
-
-        for cell in known_safes.copy():
-            self.mark_safe(cell)
-        for cell in self.safes:
-            self.mark_safe(cell)
-        
-
-        print("mines: ", self.mines)
-        print("safes: ", self.safes)
-        print("knowledge: ", len(self.knowledge))
-        i = 0
-
-        self.infer_existing_knowledge()
-        
-        while self.infer_new_knowledge():
-            self.infer_existing_knowledge()
-            print(i)
-            i += 1
-        
-                
-        return
-
-        raise NotImplementedError
-    
-    def infer_existing_knowledge(self):
-        print("-----------INFERING EXISTING KNOWLEDGE-----------")
-        knowledge_copy = self.knowledge.copy()
-        for sentence in knowledge_copy:
-            known_mines = sentence.known_mines().copy()
-            known_safes = sentence.known_safes().copy()
-
-            for cell in known_mines:
-                self.mark_mine(cell)
-            for cell in known_safes:
-                self.mark_safe(cell)
-        print("-----------INFERING EXISTING KNOWLEDGE END-----------")
-
-    def isDuplicateKnowledge(self, sentence):
-        for s in self.knowledge:
-            if s.cells == sentence.cells and s.count == sentence.count:
-                return True
-        return False
-
-    def infer_new_knowledge(self):
-        print("INFERRING NEW KNOWLEDGE.............")
-        has_new_knowledge = False
-
-        knowledge_copy = self.knowledge.copy()
+        start = time.perf_counter()
+        self.counters["clicks"] += 1
+        index = self.cell_index(cell)
+        self.move_bits |= 1 << index
+        self.mark(index, False)
+
+        # Leave out neighbors already known, counting known mines
+        neighbors, offset = self.neighbors[index]
+        mines = self.mine_bits >> offset & neighbors
+        safes = self.safe_bits >> offset & neighbors
+        new_sentence = Sentence(
+            neighbors & ~mines & ~safes, count - mines.bit_count(), offset
+        )
+        if self.trace is not None:
+            self.trace("click", {"cell": cell, "count": count, "sentence": str(new_sentence)})
+        self.add_sentence(new_sentence)
+        self.propagate()
+
+        self.timings.append(time.perf_counter() - start)
+
+    def propagate(self):
+        """
+        Draws every conclusion that follows from the pending sentences,
+        until none are left.
+
+        A pending sentence whose cells are all mines or all safe has
+        them marked, which changes, and so queues, the other sentences
+        that include them; the sentence itself is left empty and
+        dropped. Any other pending sentence is compared with the
+        sentences that share one of its cells, and whenever one's
+        cells are a subset of the other's, the sentence for their
+        difference is added, which queues it in turn.
+        """
+        while self.pending:
+            key = self.pending.popleft()
+            sentence = self.knowledge.get(key)
+            if sentence is None:
+                continue
+            self.counters["propagations"] += 1
 
-        for sentence1 in knowledge_copy:
-            if len(sentence1.cells) == 0:
-                if sentence1 in self.knowledge:
-                    self.knowledge.remove(sentence1)
+            resolved = sentence.known_mines() or sentence.known_safes()
+            if resolved:
+                mine = sentence.count > 0
+                for index in resolved:
+                    self.mark(index, mine)
                 continue
-            for sentence2 in knowledge_copy:
-                if len(sentence2.cells) == 0:
-                    if sentence2 in self.knowledge:
-                        self.knowledge.remove(sentence2)
+
+            others = set()
+            for index in sentence.indices():
+                others |= self.containing[index]
+            for other_key in others:
+                other = self.knowledge.get(other_key)
+                if other is None or other is sentence:
                     continue
-                if sentence1 == sentence2:
+                self.counters["subset_checks"] += 1
+                cells, other_cells, offset = sentence.align(other)
+                common = cells & other_cells
+                if common == cells and common != other_cells:
+                    subset, superset, difference = sentence, other, other_cells ^ cells
+                elif common == other_cells and common != cells:
+                    subset, superset, difference = other, sentence, cells ^ other_cells
+                else:
                     continue
-                if sentence1.cells.issubset(sentence2.cells):
-                    new_sentence = Sentence(sentence2.cells - sentence1.cells, sentence2.count - sentence1.count)
-                    if self.isDuplicateKnowledge(new_sentence):
-                        continue
-                    print("=======================================")
-                    print("sentence 1: ", sentence1.cells)
-                    print("sentence 2: ", sentence2.cells)
-                    print("new sentence 1: ", new_sentence)
-                    print("=======================================")
-                    has_new_knowledge = True
-                    self.knowledge.append(new_sentence)
-                    
-                elif sentence2.cells.issubset(sentence1.cells):
-                    new_sentence = Sentence(sentence1.cells - sentence2.cells, sentence1.count - sentence2.count)
-                    if self.isDuplicateKnowledge(new_sentence):
-                        continue
-                    print("=======================================")
-                    print("sentence 1: ", sentence1.cells)
-                    print("sentence 2: ", sentence2.cells)
-                    print("new sentence 2: ", new_sentence)
-                    print("=======================================")
-                    has_new_knowledge = True
-                    self.knowledge.append(new_sentence)
-        print("INFERRING NEW KNOWLEDGE ENDDING.............")
-        return has_new_knowledge
+                new_sentence = Sentence(difference, superset.count - subset.count, offset)
+                if self.add_sentence(new_sentence) and self.trace is not None:
+                    self.trace("derive", {
+                        "subset": str(subset),
+                        "superset": str(superset),
+                        "sentence": str(new_sentence),
+                    })
+
+    def isDuplicateKnowledge(self, sentence):
+        return sentence.key() in self.knowledge
 
     def make_safe_move(self):
         """
@@ -318,11 +508,10 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        for cell in self.safes:
-            if cell not in self.moves_made:
-                return cell
-        return None
-        raise NotImplementedError
+        bits = self.safe_bits & ~self.move_bits
+        if bits == 0:
+            return None
+        return divmod((bits & -bits).bit_length() - 1, self.width)
 
     def make_random_move(self):
         """
@@ -331,15 +520,15 @@ class MinesweeperAI():
             1) have not already been chosen, and
             2) are not known to be mines
         """
-        if len(self.moves_made) + len(self.mines)  == self.height * self.width:
+        excluded = self.move_bits | self.mine_bits
+        if excluded == self.all_cells:
             return None
-        random_row = random.randint(0, self.height - 1)
-        random_col = random.randint(0, self.width - 1)
+        while True:
+            random_row = random.randint(0, self.height - 1)
+            random_col = random.randint(0, self.width - 1)
+            if not excluded >> (random_row * self.width + random_col) & 1:
+                break
         random_cell = (random_row, random_col)
-
-        if random_cell in self.moves_made or random_cell in self.mines:
-            return self.make_random_move()
-        print("next random move: ", random_cell)
+        if self.trace is not None:
+            self.trace("random", {"cell": random_cell})
         return random_cell
-
-        raise NotImplementedError
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from nim import ArrayNimAI, NimAI, batch_train, parallel_train, train, winning_actions
+
+# Functions that can be benchmarked for training
+TRAINERS = ["train", "batch"]
+
+# Q-learning tables that can be benchmarked with and without symmetry
+TABLES = {"dict": NimAI, "array": ArrayNimAI}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Nim AI training.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--output", help="file to write JSON results to")
+
+    speedup = commands.add_parser(
+        "speedup", parents=[common],
+        help="compare parallel training with a single process"
+    )
+    speedup.add_argument("--games", type=int, default=10 ** 6)
+    speedup.add_argument("--piles", type=int, nargs="+", default=[1, 3, 5, 7])
+    speedup.add_argument("--workers", type=int, nargs="+", default=[os.cpu_count()])
+    speedup.add_argument("--rounds", type=int, default=10)
+    speedup.add_argument("--seed", type=int, default=0)
+
+    quality = commands.add_parser(
+        "quality", parents=[common],
+        help="measure how often the trained AI plays optimally"
+    )
+    quality.add_argument(
+        "--budgets", type=int, nargs="+", default=[10 ** 3, 10 ** 4, 10 ** 5],
+        help="numbers of training games"
+    )
+    quality.add_argument("--piles", type=int, nargs="+", default=[1, 3, 5, 7])
+    quality.add_argument("--alphas", type=float, nargs="+", default=[0.5])
+    quality.add_argument("--epsilons", type=float, nargs="+", default=[0.1])
+    quality.add_argument("--trainer", choices=TRAINERS, default="batch")
+    quality.add_argument("--seed", type=int, default=0)
+
+    curve = commands.add_parser(
+        "curve", parents=[common],
+        help="compare training curves of Q-learning variants"
+    )
+    curve.add_argument("--games", type=int, default=10 ** 4)
+    curve.add_argument("--step", type=int, default=250, help="games between measurements")
+    curve.add_argument("--piles", type=int, nargs="+", default=[1, 3, 5, 7])
+    curve.add_argument("--trace-decays", type=float, nargs="+", default=[0.5, 0.9])
+    curve.add_argument("--alpha-decay", type=float, default=1)
+    curve.add_argument("--epsilon-decay", type=float, default=0.9995)
+    curve.add_argument("--min-epsilon", type=float, default=0.01)
+    curve.add_argument("--target", type=float, default=0.95, help="accuracy counted as converged")
+    curve.add_argument("--seed", type=int, default=0)
+
+    symmetry = commands.add_parser(
+        "symmetry", parents=[common],
+        help="compare canonical Q-learning tables with plain ones"
+    )
+    symmetry.add_argument("--games", type=int, default=10 ** 4)
+    symmetry.add_argument("--step", type=int, default=250, help="games between measurements")
+    symmetry.add_argument("--piles", type=int, nargs="+", default=[1, 3, 5, 7])
+    symmetry.add_argument("--tables", choices=TABLES, nargs="+", default=list(TABLES))
+    symmetry.add_argument("--target", type=float, default=0.95, help="accuracy counted as converged")
+    symmetry.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "speedup":
+        report = benchmark_speedup(args)
+    elif args.command == "quality":
+        report = benchmark_quality(args)
+    elif args.command == "curve":
+        report = benchmark_curve(args)
+    elif args.command == "symmetry":
+        report = benchmark_symmetry(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+def benchmark_speedup(args):
+    """
+    Time training on `args.games` games in a single process and with
+    each number of workers in `args.workers`, and return the speedup
+    of each over the single process.
+    """
+    start = time.perf_counter()
+    batch_train(args.games, ArrayNimAI(args.piles), args.piles, seed=args.seed, verbose=False)
+    single = time.perf_counter() - start
+
+    results = []
+    for workers in args.workers:
+        start = time.perf_counter()
+        parallel_train(
+            args.games, ArrayNimAI(args.piles), args.piles,
+            workers=workers, rounds=args.rounds, seed=args.seed, verbose=False
+        )
+        seconds = time.perf_counter() - start
+        results.append({
+            "workers": workers,
+            "seconds": seconds,
+            "games_per_second": args.games / seconds,
+            "speedup": single / seconds,
+        })
+
+    return {
+        "piles": args.piles,
+        "games": args.games,
+        "single_process_seconds": single,
+        "results": results,
+    }
+
+
+def benchmark_quality(args):
+    """
+    Train a new AI for each combination of alpha, epsilon and number
+    of games in `args`, and return the training time and accuracy of
+    each.
+    """
+    winning = winning_actions(args.piles)
+    results = []
+    for alpha in args.alphas:
+        for epsilon in args.epsilons:
+            for games in args.budgets:
+                ai = ArrayNimAI(args.piles, alpha, epsilon)
+                random.seed(args.seed)
+                start = time.perf_counter()
+                if args.trainer == "train":
+                    train(games, ai, args.piles, progress=0, verbose=False)
+                else:
+                    batch_train(games, ai, args.piles, seed=args.seed, verbose=False)
+                seconds = time.perf_counter() - start
+                results.append({
+                    "alpha": alpha,
+                    "epsilon": epsilon,
+                    "games": games,
+                    "seconds": seconds,
+                    "accuracy": accuracy(ai, winning),
+                })
+
+    return {
+        "piles": args.piles,
+        "trainer": args.trainer,
+        "winning_states": sum(1 for actions in winning.values() if actions),
+        "results": results,
+    }
+
+
+def benchmark_curve(args):
+    """
+    Train the current Q-learning AI and each variant in `args` with
+    `train`, measuring accuracy every `args.step` games, and return
+    each variant's training curve and the number of games it took to
+    reach `args.target` accuracy.
+    """
+    winning = winning_actions(args.piles)
+    variants = [("current", dict())]
+    for trace_decay in args.trace_decays:
+        variants.append((f"q-lambda {trace_decay}", dict(trace_decay=trace_decay)))
+    schedule = dict(
+        alpha_decay=args.alpha_decay,
+        epsilon_decay=args.epsilon_decay,
+        min_epsilon=args.min_epsilon
+    )
+    variants.append(("decay", schedule))
+    for trace_decay in args.trace_decays:
+        variants.append((f"q-lambda {trace_decay} + decay", dict(trace_decay=trace_decay, **schedule)))
+
+    results = []
+    for name, options in variants:
+        ai = ArrayNimAI(args.piles, **options)
+        random.seed(args.seed)
+        curve = []
+        converged = None
+        seconds = 0
+        for games in range(args.step, args.games + 1, args.step):
+            start = time.perf_counter()
+            train(args.step, ai, args.piles, progress=0, verbose=False)
+            seconds += time.perf_counter() - start
+            score = accuracy(ai, winning)
+            curve.append({"games": games, "accuracy": score})
+            if converged is None and score >= args.target:
+                converged = games
+        results.append({
+            "variant": name,
+            "options": options,
+            "seconds": seconds,
+            "games_to_convergence": converged,
+            "curve": curve,
+        })
+
+    return {
+        "piles": args.piles,
+        "target": args.target,
+        "results": results,
+    }
+
+
+def benchmark_symmetry(args):
+    """
+    Train each kind of table in `args.tables` with and without
+    canonical states, measuring accuracy every `args.step` games as
+    in `benchmark_curve`, and return the size of each table, its
+    training rate and the number of games it took to reach
+    `args.target` accuracy.
+    """
+    winning = winning_actions(args.piles)
+    results = []
+    for table in args.tables:
+        for canonical in (False, True):
+            if table == "array":
+                ai = ArrayNimAI(args.piles, canonical=canonical)
+            else:
+                ai = NimAI(canonical=canonical)
+            random.seed(args.seed)
+            converged = None
+            seconds = 0
+            for games in range(args.step, args.games + 1, args.step):
+                start = time.perf_counter()
+                train(args.step, ai, args.piles, progress=0, verbose=False)
+                seconds += time.perf_counter() - start
+                if converged is None and accuracy(ai, winning) >= args.target:
+                    converged = games
+            results.append({
+                "table": table,
+                "canonical": canonical,
+                "entries": len(ai.q) if table == "dict" else int(ai.q.size),
+                "bytes": table_size(ai.q),
+                "games_per_second": args.games / seconds,
+                "games_to_convergence": converged,
+                "accuracy": accuracy(ai, winning),
+            })
+
+    return {
+        "piles": args.piles,
+        "target": args.target,
+        "results": results,
+    }
+
+
+def table_size(q):
+    """
+    Return the approximate number of bytes used by the Q-learning
+    table `q`: a NumPy array, or a dictionary including its keys and
+    values.
+    """
+    if not isinstance(q, dict):
+        return int(q.nbytes)
+    return sys.getsizeof(q) + sum(
+        sys.getsizeof(key) + sys.getsizeof(key[0]) + sys.getsizeof(key[1]) + sys.getsizeof(value)
+        for key, value in q.items()
+    )
+
+
+def accuracy(ai, winning):
+    """
+    Return the fraction of states with a winning action, in the
+    dictionary `winning` returned by `winning_actions`, in which the
+    greedy action of `ai` is one of them.
+    """
+    states = [state for state, actions in winning.items() if actions]
+    correct = sum(
+        1 for state in states
+        if ai.choose_action(list(state), epsilon=False) in winning[state]
+    )
+    return correct / len(states)
+
+
+if __name__ == "__main__":
+    main()
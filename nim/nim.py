@@ -1,7 +1,25 @@
+import functools
+import itertools
 import math
+import os
 import random
+import struct
 import time
 
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Header of saved Nim policies: magic, version, number of piles, and
+# then the initial piles, padded so the Q-table is aligned for mapping
+POLICY_MAGIC = b"NIMQ"
+POLICY_VERSION = 1
+POLICY_ALIGNMENT = 64
+
+# Number of states whose legal actions and successors are kept cached
+TRANSITION_CACHE_SIZE = 2 ** 16
+
 
 class Nim():
 
@@ -16,21 +34,50 @@ class Nim():
         self.piles = initial.copy()
         self.player = 0
         self.winner = None
+        self.remaining = sum(self.piles)
 
     @classmethod
     def available_actions(cls, piles):
         """
         Nim.available_actions(piles) takes a `piles` list as input
-        and returns all of the available actions `(i, j)` in that state.
+        and returns all of the available actions `(i, j)` in that state,
+        as a frozen set shared by every caller.
 
         Action `(i, j)` represents the action of removing `j` items
         from pile `i` (where piles are 0-indexed).
         """
-        actions = set()
-        for i, pile in enumerate(piles):
-            for j in range(1, pile + 1):
-                actions.add((i, j))
-        return actions
+        return _action_set(tuple(piles))
+
+    @classmethod
+    def transitions(cls, piles):
+        """
+        Nim.transitions(piles) returns a tuple of `(action, new_piles)`
+        pairs for every available action in state `piles`, where
+        `new_piles` is the tuple of piles after the action. Actions are
+        ordered by pile and then by count.
+
+        Results are cached for the `TRANSITION_CACHE_SIZE` most
+        recently used states.
+        """
+        return _transitions(tuple(piles))
+
+    @classmethod
+    def canonical(cls, piles):
+        """
+        Nim.canonical(piles) returns `(state, positions, order)` for
+        state `piles`, where
+            - `state` is the tuple of piles in increasing order, which
+              is the same for every permutation of `piles`
+            - `positions[i]` is the position in `state` of the first
+              pile of the same size as pile `i`, so that action `(i, j)`
+              in `piles` is action `(positions[i], j)` in `state`
+            - `order[k]` is a pile of `piles` of the same size as pile
+              `k` of `state`, so that action `(k, j)` in `state` is
+              action `(order[k], j)` in `piles`
+
+        Results are cached like those of `Nim.transitions`.
+        """
+        return _canonical(tuple(piles))
 
     @classmethod
     def other_player(cls, player):
@@ -40,6 +87,15 @@ class Nim():
         """
         return 0 if player == 1 else 1
 
+    def reset(self, initial=[1, 3, 5, 7]):
+        """
+        Start a new game on the same board, with piles `initial`.
+        """
+        self.piles[:] = initial
+        self.player = 0
+        self.winner = None
+        self.remaining = sum(self.piles)
+
     def switch_player(self):
         """
         Switch the current player to the other player.
@@ -63,16 +119,42 @@ class Nim():
 
         # Update pile
         self.piles[pile] -= count
+        self.remaining -= count
         self.switch_player()
 
         # Check for a winner
-        if all(pile == 0 for pile in self.piles):
+        if self.remaining == 0:
             self.winner = self.player
 
 
+@functools.lru_cache(maxsize=TRANSITION_CACHE_SIZE)
+def _transitions(state):
+    return tuple(
+        ((i, j), state[:i] + (pile - j,) + state[i + 1:])
+        for i, pile in enumerate(state)
+        for j in range(1, pile + 1)
+    )
+
+
+@functools.lru_cache(maxsize=TRANSITION_CACHE_SIZE)
+def _action_set(state):
+    return frozenset(action for action, _ in _transitions(state))
+
+
+@functools.lru_cache(maxsize=TRANSITION_CACHE_SIZE)
+def _canonical(state):
+    order = tuple(sorted(range(len(state)), key=state.__getitem__))
+    canonical = tuple(state[i] for i in order)
+    first = {pile: canonical.index(pile) for pile in set(canonical)}
+    positions = tuple(first[pile] for pile in state)
+    return canonical, positions, order
+
+
 class NimAI():
 
-    def __init__(self, alpha=0.5, epsilon=0.1):
+    def __init__(self, alpha=0.5, epsilon=0.1, trace_decay=0,
+                 alpha_decay=1, epsilon_decay=1, min_alpha=0, min_epsilon=0,
+                 canonical=False):
         """
         Initialize AI with an empty Q-learning dictionary,
         an alpha (learning) rate, and an epsilon rate.
@@ -81,20 +163,80 @@ class NimAI():
         pairs to a Q-value (a number).
          - `state` is a tuple of remaining piles, e.g. (1, 1, 4, 4)
          - `action` is a tuple `(i, j)` for an action
+
+        If `trace_decay` (lambda) is above 0, updates use Watkins's
+        Q(lambda): each player's earlier moves in the game also get a
+        share of every update, decayed by `trace_decay` per move, until
+        that player makes a random (non-greedy) move.
+
+        After each game, alpha and epsilon are multiplied by
+        `alpha_decay` and `epsilon_decay`, but not below `min_alpha`
+        and `min_epsilon`.
+
+        If `canonical` is true, states that are permutations of each
+        other share their Q-values: every `(state, action)` pair is
+        stored as the pair for `Nim.canonical(state)`, with the piles
+        in increasing order, so the AI learns from any ordering of the
+        piles at once. Taking from any of several equal piles is then
+        also the same action.
         """
         self.q = dict()
         self.alpha = alpha
         self.epsilon = epsilon
-
-    def update(self, old_state, action, new_state, reward):
+        self.trace_decay = trace_decay
+        self.alpha_decay = alpha_decay
+        self.epsilon_decay = epsilon_decay
+        self.min_alpha = min_alpha
+        self.min_epsilon = min_epsilon
+        self.canonical = canonical
+
+        # Eligibility trace of each player, mapping `(state, action)`
+        # pairs to how much of the next update they receive
+        self.traces = {0: dict(), 1: dict()}
+
+    def update(self, old_state, action, new_state, reward, player=None):
         """
         Update Q-learning model, given an old state, an action taken
         in that state, a new resulting state, and the reward received
         from taking that action.
+
+        `player` is the player who took the action; eligibility traces
+        are only used when it is given.
         """
         old = self.get_q_value(old_state, action)
         best_future = self.best_future_reward(new_state)
-        self.update_q_value(old_state, action, old, reward, best_future)
+        if self.trace_decay == 0 or player is None:
+            self.update_q_value(old_state, action, old, reward, best_future)
+            return
+
+        # A random move ends the credit earlier moves get for what follows
+        trace = self.traces[player]
+        state = tuple(old_state)
+        if old < self.best_future_reward(state):
+            trace.clear()
+        trace[(state, action)] = 1
+
+        error = reward + best_future - old
+        for (state, action), eligibility in trace.items():
+            value = self.get_q_value(state, action)
+            self.set_q_value(state, action, value + self.alpha * error * eligibility)
+            trace[(state, action)] = eligibility * self.trace_decay
+
+    def end_game(self):
+        """
+        Clear the eligibility traces, and decay alpha and epsilon,
+        at the end of a training game.
+        """
+        self.traces[0].clear()
+        self.traces[1].clear()
+        self.decay()
+
+    def decay(self, games=1):
+        """
+        Decay alpha and epsilon as for `games` finished games.
+        """
+        self.alpha = max(self.min_alpha, self.alpha * self.alpha_decay ** games)
+        self.epsilon = max(self.min_epsilon, self.epsilon * self.epsilon_decay ** games)
 
     def get_q_value(self, state, action):
         """
@@ -102,7 +244,7 @@ class NimAI():
         If no Q-value exists yet in `self.q`, return 0.
         """
         
-        return self.q.get((tuple(state), action), 0)
+        return self.q.get(self.key(state, action), 0)
         raise NotImplementedError
 
     def update_q_value(self, state, action, old_q, reward, future_rewards):
@@ -120,10 +262,27 @@ class NimAI():
         `alpha` is the learning rate, and `new value estimate`
         is the sum of the current reward and estimated future rewards.
         """
-        self.q[(tuple(state), action)] = old_q + (self.alpha * (reward + future_rewards - old_q))
+        self.set_q_value(state, action, old_q + (self.alpha * (reward + future_rewards - old_q)))
         return None
         raise NotImplementedError
 
+    def set_q_value(self, state, action, value):
+        """
+        Set the Q-value for the state `state` and the action `action`.
+        """
+        self.q[self.key(state, action)] = value
+
+    def key(self, state, action):
+        """
+        Return the `(state, action)` pair under which the Q-value of
+        state `state` and action `action` is stored.
+        """
+        if not self.canonical:
+            return tuple(state), action
+        state, positions, _ = Nim.canonical(state)
+        pile, count = action
+        return state, (positions[pile], count)
+
     def best_future_reward(self, state):
         """
         Given a state `state`, consider all possible `(state, action)`
@@ -134,15 +293,12 @@ class NimAI():
         Q-value in `self.q`. If there are no available actions in
         `state`, return 0.
         """
-        has_actions = False
-        best_reward = float('-inf')
-
-        for pile in range(len(state)):
-            for i in range(state[pile]):
-                has_actions = True
-                best_reward = max(best_reward, self.get_q_value(state, (pile, i + 1)))
+        state = tuple(state)
+        transitions = Nim.transitions(state)
+        if len(transitions) == 0:
+            return 0
 
-        return best_reward if has_actions else 0
+        return max(self.get_q_value(state, action) for action, _ in transitions)
         raise NotImplementedError
 
     def choose_action(self, state, epsilon=True):
@@ -160,19 +316,16 @@ class NimAI():
         If multiple actions have the same Q-value, any of those
         options is an acceptable return value.
         """
-        actions = []
-        for pile in range(len(state)):
-            for i in range(state[pile]):
-                action = (pile, i + 1)
-                actions.append(action)
+        state = tuple(state)
+        transitions = Nim.transitions(state)
 
         if epsilon and random.random() <= self.epsilon:
-            return random.choice(actions)
+            return random.choice(transitions)[0]
 
         best_action = None
         best_value = float('-inf')
 
-        for action in actions:
+        for action, _ in transitions:
             value = self.get_q_value(state, action)
             if value > best_value:
                 best_value = value
@@ -182,65 +335,573 @@ class NimAI():
         raise NotImplementedError
 
 
-def train(n):
+class ArrayNimAI(NimAI):
+
+    def __init__(self, initial=[1, 3, 5, 7], alpha=0.5, epsilon=0.1, q=None,
+                 trace_decay=0, alpha_decay=1, epsilon_decay=1, min_alpha=0,
+                 min_epsilon=0, canonical=False):
+        """
+        Initialize AI with a Q-learning table for games that start
+        with piles `initial`, an alpha (learning) rate, and an
+        epsilon rate. If `q` is given, it is used as the table.
+        Other options are as for `NimAI`.
+
+        The Q-learning table `q` is a NumPy array with a row for each
+        state and a column for each action.
+         - state `(p0, p1, ...)` is row `p0 + (initial[0] + 1) * (p1 + ...)`,
+           reading the piles as digits of a mixed-radix number
+         - action `(i, j)` is column `j - 1` plus the sizes of the
+           initial piles before pile `i`
+        Q-values of available actions start at 0, and those of
+        unavailable actions are fixed at -inf, so the best action in
+        a state is simply the argmax of its row.
+
+        If `canonical` is true, the table only has rows for canonical
+        states, as in `NimAI`, numbered in lexicographic order in
+        `self.rows`, and columns are laid out for the initial piles
+        in increasing order. Only the first of several equal piles
+        has available actions. Such tables cannot be used by
+        `batch_train` or saved.
+        """
+        super().__init__(
+            alpha, epsilon, trace_decay, alpha_decay, epsilon_decay,
+            min_alpha, min_epsilon, canonical
+        )
+        self.initial = list(initial)
+        if canonical:
+            initial = sorted(initial)
+
+        # Place value of each pile in a state's row number
+        self.strides = [math.prod(pile + 1 for pile in initial[:i]) for i in range(len(initial))]
+        self.num_states = math.prod(pile + 1 for pile in initial)
+
+        # Column offset of each pile, and the pile and count of each column
+        self.offsets = [sum(initial[:i]) for i in range(len(initial))]
+        self.actions = [
+            (i, j) for i, pile in enumerate(initial) for j in range(1, pile + 1)
+        ]
+        self.action_piles = np.array([i for i, _ in self.actions], dtype=np.int64)
+        self.action_counts = np.array([j for _, j in self.actions], dtype=np.int64)
+
+        if canonical:
+            # The k-th smallest pile never exceeds the k-th smallest initial pile
+            self.states = [
+                state for state in itertools.combinations_with_replacement(
+                    range(max(initial, default=0) + 1), len(initial)
+                )
+                if all(pile <= limit for pile, limit in zip(state, initial))
+            ]
+            self.rows = {state: row for row, state in enumerate(self.states)}
+            self.num_states = len(self.states)
+
+        if q is None:
+            if canonical:
+                piles = np.array(self.states, dtype=np.int64).reshape(self.num_states, len(initial))
+                first = np.ones(piles.shape, dtype=bool)
+                first[:, 1:] = piles[:, 1:] != piles[:, :-1]
+                legal = (self.action_counts <= piles[:, self.action_piles]) & first[:, self.action_piles]
+            else:
+                legal = self.action_counts <= self.decode(np.arange(self.num_states))[:, self.action_piles]
+            q = np.where(legal, 0.0, -np.inf)
+        self.q = q
+
+        # Rows of the states seen so far, since encoding a state
+        # costs more than looking it up
+        self.encoded = dict()
+
+    @classmethod
+    def header(cls, initial):
+        """
+        ArrayNimAI.header(initial) returns the header of a saved
+        policy for games that start with piles `initial`.
+        """
+        header = struct.pack(
+            f"<4sHH{len(initial)}H",
+            POLICY_MAGIC, POLICY_VERSION, len(initial), *initial
+        )
+        padding = -len(header) % POLICY_ALIGNMENT
+        return header + bytes(padding)
+
+    def save(self, path):
+        """
+        Save the Q-learning table to the file `path`, as a header
+        followed by the table as 32-bit floats in row order.
+
+        The file is written alongside and then moved into place, so an
+        interrupted save never leaves a partial policy at `path`.
+        """
+        if self.canonical:
+            raise ValueError("Canonical Q-learning tables cannot be saved")
+        with open(path + ".tmp", "wb") as f:
+            f.write(ArrayNimAI.header(self.initial))
+            f.write(self.q.astype("<f4").tobytes())
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path, initial=None, alpha=0.5, epsilon=0.1):
+        """
+        ArrayNimAI.load(path) returns an AI using the Q-learning table
+        saved in the file `path`. The table is memory-mapped, so it is
+        only read from disk as it is used, and further training
+        changes only the copy in memory.
+
+        If `initial` is given, the policy must have been saved for
+        games that start with those piles. Raises `ValueError` if the
+        file is not a policy, or is truncated.
+        """
+        invalid = ValueError(f"{path} is not a version {POLICY_VERSION} Nim policy")
+        with open(path, "rb") as f:
+            header = f.read(8)
+            if len(header) < 8:
+                raise invalid
+            magic, version, count = struct.unpack("<4sHH", header)
+            if magic != POLICY_MAGIC or version != POLICY_VERSION:
+                raise invalid
+            header = f.read(2 * count)
+            if len(header) < 2 * count:
+                raise invalid
+            piles = list(struct.unpack(f"<{count}H", header))
+            size = os.fstat(f.fileno()).st_size
+        if initial is not None and list(initial) != piles:
+            raise ValueError(f"Policy is for piles {piles}, not {list(initial)}")
+
+        # The table must fill the rest of the file exactly
+        shape = (math.prod(pile + 1 for pile in piles), sum(piles))
+        offset = len(ArrayNimAI.header(piles))
+        if size != offset + shape[0] * shape[1] * 4:
+            raise invalid
+        q = np.memmap(path, dtype="<f4", mode="c", offset=offset, shape=shape)
+        return cls(piles, alpha, epsilon, q)
+
+    def encode(self, state):
+        """
+        Return the row of the Q-learning table for state `state`.
+        """
+        if self.canonical:
+            return self.rows[Nim.canonical(state)[0]]
+        state = tuple(state)
+        row = self.encoded.get(state)
+        if row is None:
+            row = sum(pile * stride for pile, stride in zip(state, self.strides))
+            self.encoded[state] = row
+        return row
+
+    def decode(self, codes):
+        """
+        Return an array of the piles in each of the rows `codes`.
+        """
+        codes = np.asarray(codes)
+        if self.canonical:
+            return np.array(self.states, dtype=np.int64)[codes]
+        return np.stack([
+            codes // stride % (pile + 1)
+            for pile, stride in zip(self.initial, self.strides)
+        ], axis=-1)
+
+    def action_index(self, action):
+        """
+        Return the column of the Q-learning table for action `action`.
+        """
+        pile, count = action
+        return self.offsets[pile] + count - 1
+
+    def key(self, state, action):
+        """
+        Return the `(row, column)` of the Q-learning table for state
+        `state` and action `action`.
+        """
+        if self.canonical:
+            state, positions, _ = Nim.canonical(state)
+            pile, count = action
+            return self.rows[state], self.offsets[positions[pile]] + count - 1
+        return self.encode(state), self.action_index(action)
+
+    def update(self, old_state, action, new_state, reward, player=None):
+        """
+        Update Q-learning model, as in `NimAI.update`, looking up
+        each state's row only once.
+        """
+        if self.trace_decay != 0 and player is not None:
+            return super().update(old_state, action, new_state, reward, player)
+
+        row, column = self.key(old_state, action)
+        old = self.q[row, column]
+        best_future = self.best_future_reward(new_state)
+        self.q[row, column] = old + self.alpha * (reward + best_future - old)
+
+    def get_q_value(self, state, action):
+        """
+        Return the Q-value for the state `state` and the action `action`.
+        """
+        return self.q[self.key(state, action)]
+
+    def set_q_value(self, state, action, value):
+        """
+        Set the Q-value for the state `state` and the action `action`.
+        """
+        self.q[self.key(state, action)] = value
+
+    def best_future_reward(self, state):
+        """
+        Return the maximum Q-value of the actions available in state
+        `state`, or 0 if there are none.
+        """
+        # Python's max is faster than NumPy's on rows this short
+        best = max(self.q[self.encode(state)].tolist())
+        return best if best > -np.inf else 0
+
+    def choose_action(self, state, epsilon=True):
+        """
+        Given a state `state`, return an action `(i, j)` to take,
+        as in `NimAI.choose_action`.
+
+        If multiple actions have the same Q-value, the first of them
+        in column order is returned. With a canonical table, random
+        actions are chosen among distinct canonical actions.
+        """
+        row = self.q[self.encode(state)]
+
+        if epsilon and random.random() <= self.epsilon:
+            column = random.choice(np.flatnonzero(row > -np.inf))
+        else:
+            column = row.argmax()
+
+        pile, count = self.actions[column]
+        if self.canonical:
+            pile = Nim.canonical(state)[2][pile]
+        return pile, count
+
+
+def winning_actions(initial=[1, 3, 5, 7]):
+    """
+    Return a dictionary mapping every state reachable from piles
+    `initial` to the set of its winning actions: those after which
+    the player who made them wins, however the opponent plays.
+    The set is empty if the player to move loses against perfect play.
+
+    States are solved by minimax over `Nim.available_actions` in
+    lexicographic order, since every action leads to an earlier state.
+    The player who takes the last object loses, so the player to
+    move in the empty state has won.
+    """
+    wins = dict()
+    winning = dict()
+    for state in itertools.product(*(range(pile + 1) for pile in initial)):
+        actions = set()
+        for action in Nim.available_actions(state):
+            pile, count = action
+            new_state = state[:pile] + (state[pile] - count,) + state[pile + 1:]
+            if not wins[new_state]:
+                actions.add(action)
+        wins[state] = len(actions) > 0 or sum(state) == 0
+        winning[state] = actions
+    return winning
+
+
+def train(n, ai=None, initial=[1, 3, 5, 7], progress=1, interval=None,
+          verbose=True):
     """
     Train an AI by playing `n` games against itself.
+    If `ai` is given, it is trained in place of a new `NimAI`,
+    playing games that start with piles `initial`.
+
+    A line is printed every `progress` games, or never if `progress`
+    is 0 or `None`. If `interval` is set, the number of games played
+    and the games per second so far are also printed, at most once
+    every `interval` seconds. The training rate is printed when done
+    if `verbose` is true.
     """
 
-    player = NimAI()
+    player = ai if ai is not None else NimAI()
+
+    # Reuse one game, and the record of each player's last move
+    game = Nim(initial)
+    last_state = [None, None]
+    last_action = [None, None]
+
+    start = time.perf_counter()
+    last_report = start
 
     # Play n games
     for i in range(n):
-        print(f"Playing training game {i + 1}")
-        game = Nim()
-
-        # Keep track of last move made by either player
-        last = {
-            0: {"state": None, "action": None},
-            1: {"state": None, "action": None}
-        }
+        if progress and (i + 1) % progress == 0:
+            print(f"Playing training game {i + 1}")
+        if interval is not None:
+            now = time.perf_counter()
+            if now - last_report >= interval:
+                print(f"Played {i} training games ({i / (now - start):.0f} games/s)")
+                last_report = now
+
+        game.reset(initial)
+        last_state[0] = last_state[1] = None
+        last_action[0] = last_action[1] = None
 
         # Game loop
         while True:
 
             # Keep track of current state and action
             state = game.piles.copy()
-            action = player.choose_action(game.piles)
+            action = player.choose_action(state)
 
             # Keep track of last state and action
-            last[game.player]["state"] = state
-            last[game.player]["action"] = action
+            last_state[game.player] = state
+            last_action[game.player] = action
 
             # Make move
             game.move(action)
-            new_state = game.piles.copy()
+            new_state = game.piles
 
             # When game is over, update Q values with rewards
             if game.winner is not None:
-                player.update(state, action, new_state, -1)
+                player.update(state, action, new_state, -1, Nim.other_player(game.player))
                 player.update(
-                    last[game.player]["state"],
-                    last[game.player]["action"],
+                    last_state[game.player],
+                    last_action[game.player],
                     new_state,
-                    1
+                    1,
+                    game.player
                 )
+                player.end_game()
                 break
 
             # If game is continuing, no rewards yet
-            elif last[game.player]["state"] is not None:
+            elif last_state[game.player] is not None:
                 player.update(
-                    last[game.player]["state"],
-                    last[game.player]["action"],
+                    last_state[game.player],
+                    last_action[game.player],
                     new_state,
-                    0
+                    0,
+                    game.player
                 )
 
-    print("Done training")
+    elapsed = time.perf_counter() - start
+    rate = n / elapsed if elapsed > 0 else float("inf")
+    if verbose:
+        print(f"Done training ({rate:.0f} games/s)")
 
     # Return the trained AI
     return player
 
 
+def batch_train(n, ai=None, initial=[1, 3, 5, 7], batch=1024, seed=None,
+                verbose=True):
+    """
+    Train an `ArrayNimAI` by playing `n` games against itself,
+    advancing `batch` games at a time in lockstep.
+
+    Each step picks epsilon-greedy actions for every game at once,
+    then applies the same updates as `train` for all of them in bulk.
+    Every update in a step is computed from the Q-values before the
+    step; if several games update the same state and action, their
+    new value estimates are averaged and applied once. `seed` seeds
+    the random number generator. The training rate is printed when
+    done if `verbose` is true.
+
+    Alpha and epsilon decay as games finish, but eligibility traces
+    are not used. Canonical tables are not supported, since rows of
+    successor states are found by subtracting from row numbers.
+    """
+
+    player = ai if ai is not None else ArrayNimAI(initial)
+    if player.canonical:
+        raise ValueError("Canonical Q-learning tables cannot be batch trained")
+    rng = np.random.default_rng(seed)
+    q = player.q
+    num_actions = len(player.actions)
+
+    # Amount each action subtracts from a state's row number
+    strides = np.array(player.strides)
+    steps = player.action_counts * strides[player.action_piles]
+
+    # State of each game, and each player's last move as (row, column)
+    size = min(batch, n)
+    start_row = player.encode(initial)
+    rows = np.full(size, start_row)
+    movers = np.zeros(size, dtype=np.int64)
+    last_rows = np.full((size, 2), -1)
+    last_columns = np.full((size, 2), -1)
+    active = np.ones(size, dtype=bool)
+    started = size
+    finished = 0
+
+    start = time.perf_counter()
+    while finished < n:
+        games = np.flatnonzero(active)
+        current = rows[games]
+        values = q[current]
+        available = values > -np.inf
+
+        # Random actions get a random score among available actions
+        explore = rng.random(len(games)) <= player.epsilon
+        scores = np.where(
+            explore[:, np.newaxis],
+            np.where(available, rng.random(values.shape), -1),
+            values
+        )
+        columns = scores.argmax(axis=1)
+
+        # Make moves
+        players = movers[games]
+        opponents = 1 - players
+        new_rows = current - steps[columns]
+        last_rows[games, players] = current
+        last_columns[games, players] = columns
+        over = new_rows == 0
+        future = q[new_rows].max(axis=1)
+        future[over] = 0
+
+        # Updates are (row, column, new value estimate): the loser's move
+        # and winner's last move when a game ends, and otherwise the
+        # last move of the player about to move
+        opponent_rows = last_rows[games, opponents]
+        opponent_columns = last_columns[games, opponents]
+        rewarded = over & (opponent_rows >= 0)
+        continuing = ~over & (opponent_rows >= 0)
+        update_rows = np.concatenate([
+            current[over], opponent_rows[rewarded], opponent_rows[continuing]
+        ])
+        update_columns = np.concatenate([
+            columns[over], opponent_columns[rewarded], opponent_columns[continuing]
+        ])
+        targets = np.concatenate([
+            np.full(over.sum(), -1.0),
+            np.full(rewarded.sum(), 1.0),
+            future[continuing]
+        ])
+
+        # Average the estimates for each distinct state and action
+        keys, inverse = np.unique(
+            update_rows * num_actions + update_columns, return_inverse=True
+        )
+        estimates = np.bincount(inverse, weights=targets) / np.bincount(inverse)
+        update_rows, update_columns = np.divmod(keys, num_actions)
+        old = q[update_rows, update_columns]
+        q[update_rows, update_columns] = old + player.alpha * (estimates - old)
+
+        rows[games] = new_rows
+        movers[games] = opponents
+
+        # Start new games in place of finished ones until n have started
+        done = games[over]
+        finished += len(done)
+        player.decay(len(done))
+        restart = done[:max(0, n - started)]
+        started += len(restart)
+        rows[restart] = start_row
+        movers[restart] = 0
+        last_rows[restart] = -1
+        last_columns[restart] = -1
+        active[done[len(restart):]] = False
+
+    elapsed = time.perf_counter() - start
+    rate = n / elapsed if elapsed > 0 else float("inf")
+    if verbose:
+        print(f"Done training ({rate:.0f} games/s)")
+
+    return player
+
+
+def parallel_train(n, ai=None, initial=[1, 3, 5, 7], workers=None, rounds=10,
+                   batch=1024, seed=None, verbose=True):
+    """
+    Train an `ArrayNimAI` by playing `n` games against itself, split
+    across a pool of `workers` processes.
+
+    Training runs in `rounds`. In each round every worker copies the
+    master Q-table from shared memory, trains its copy on its share of
+    the round's games with `batch_train`, and writes it back to its
+    own slot of shared memory. The master table is then replaced by
+    the average of the workers' tables. Each worker's games in each
+    round use their own random stream spawned from `seed`, so results
+    for a given `seed` and number of workers are reproducible. The
+    training rate is printed when done if `verbose` is true.
+
+    Workers start each round from the master's alpha and epsilon and
+    decay them with its schedule as their games finish; after each
+    round the master decays them for all of the round's games. As in
+    `batch_train`, eligibility traces are not used.
+    """
+
+    player = ai if ai is not None else ArrayNimAI(initial)
+    if player.canonical:
+        raise ValueError("Canonical Q-learning tables cannot be batch trained")
+    workers = workers or os.cpu_count()
+    schedule = dict(
+        alpha_decay=player.alpha_decay,
+        epsilon_decay=player.epsilon_decay,
+        min_alpha=player.min_alpha,
+        min_epsilon=player.min_epsilon
+    )
+    shape = player.q.shape
+    dtype = player.q.dtype
+
+    # Split the games as evenly as possible over rounds and workers
+    tasks = rounds * workers
+    games = [n // tasks + (1 if k < n % tasks else 0) for k in range(tasks)]
+    seeds = np.random.SeedSequence(seed).spawn(tasks)
+
+    master = shared_memory.SharedMemory(create=True, size=player.q.nbytes)
+    tables = shared_memory.SharedMemory(create=True, size=player.q.nbytes * workers)
+    try:
+        master_q = np.ndarray(shape, dtype, buffer=master.buf)
+        worker_q = np.ndarray((workers,) + shape, dtype, buffer=tables.buf)
+        master_q[:] = player.q
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_train_worker,
+            initargs=(master.name, tables.name, workers, dtype, player.initial, schedule)
+        ) as executor:
+            for r in range(rounds):
+                round_games = games[r * workers:(r + 1) * workers]
+                round_tasks = [
+                    (w, round_games[w], seeds[r * workers + w], batch, player.alpha, player.epsilon)
+                    for w in range(workers)
+                ]
+                list(executor.map(_train_worker, round_tasks))
+                master_q[:] = worker_q.mean(axis=0)
+                player.decay(sum(round_games))
+
+        elapsed = time.perf_counter() - start
+        rate = n / elapsed if elapsed > 0 else float("inf")
+        if verbose:
+            print(f"Done training ({rate:.0f} games/s)")
+
+        player.q[:] = master_q
+        del master_q, worker_q
+    finally:
+        master.close()
+        master.unlink()
+        tables.close()
+        tables.unlink()
+
+    return player
+
+
+# Shared memory and AI settings used by a training worker process
+_train_worker_state = None
+
+
+def _init_train_worker(master_name, tables_name, workers, dtype, initial, schedule):
+    global _train_worker_state
+    master = shared_memory.SharedMemory(name=master_name)
+    tables = shared_memory.SharedMemory(name=tables_name)
+    _train_worker_state = (master, tables, workers, dtype, initial, schedule)
+
+
+def _train_worker(task):
+    slot, games, seed, batch, alpha, epsilon = task
+    master, tables, workers, dtype, initial, schedule = _train_worker_state
+
+    # Train a private copy of the master table, in the table's own type
+    ai = ArrayNimAI(initial, alpha, epsilon, **schedule)
+    ai.q = np.ndarray(ai.q.shape, dtype, buffer=master.buf).copy()
+    batch_train(games, ai, initial, batch, seed, verbose=False)
+    worker_q = np.ndarray((workers,) + ai.q.shape, dtype, buffer=tables.buf)
+    worker_q[slot] = ai.q
+
+
 def play(ai, human_player=None):
     """
     Play human game against the AI.
@@ -1,4 +1,12 @@
-from nim import train, play
+from nim import ArrayNimAI, train, play
 
-ai = train(1000)
+# Trained policy, reused between games
+POLICY = "policy.nimq"
+PILES = [1, 3, 5, 7]
+
+try:
+    ai = ArrayNimAI.load(POLICY, PILES)
+except (OSError, ValueError):
+    ai = train(1000, ArrayNimAI(PILES), PILES)
+    ai.save(POLICY)
 play(ai)
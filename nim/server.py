@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+
+from nim import ArrayNimAI, Nim, batch_train
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+# Protocol, one command or reply per line:
+#   client: NEW [0|1]        start a game, as player 0 or 1 (default random)
+#   client: MOVE pile count  take `count` objects from pile `pile`
+#   client: STATS            ask for the server's latency statistics
+#   client: QUIT             close the connection
+#   server: PILES p0 p1 ...  the piles after each move
+#   server: TURN             waiting for the client's move
+#   server: AI pile count    the AI's move
+#   server: WINNER HUMAN|AI  the game is over
+#   server: STATS {...}      latency statistics as JSON
+#   server: ERROR message    the command was not understood or not allowed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Nim games against a trained AI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--host", default=HOST)
+    common.add_argument("--port", type=int, default=PORT)
+    common.add_argument("--unix", help="path of a Unix socket to use instead of TCP")
+
+    server = commands.add_parser("serve", parents=[common], help="run the match server")
+    server.add_argument("--policy", help="saved policy to load instead of training")
+    server.add_argument("--piles", type=int, nargs="+", default=[1, 3, 5, 7])
+    server.add_argument("--games", type=int, default=10 ** 5, help="training games if no policy")
+    server.add_argument("--delay", type=float, default=0, help="seconds to wait before each AI move")
+
+    simulate = commands.add_parser("simulate", parents=[common], help="load test a running server")
+    simulate.add_argument("--clients", type=int, default=100)
+    simulate.add_argument("--games", type=int, default=10, help="games per client")
+    simulate.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        if args.policy:
+            ai = ArrayNimAI.load(args.policy, args.piles)
+        else:
+            ai = batch_train(args.games, ArrayNimAI(args.piles), args.piles)
+        asyncio.run(serve(ai, args.piles, args.host, args.port, args.unix, args.delay))
+    else:
+        report = asyncio.run(simulate_clients(
+            args.clients, args.games, args.host, args.port, args.unix, args.seed
+        ))
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+class Metrics():
+
+    def __init__(self):
+        """
+        Initialize empty latency metrics.
+        Each metrics object has
+            - `games`: how many games have been started
+            - `latencies`: the seconds taken to choose each AI move
+        """
+        self.games = 0
+        self.latencies = []
+
+    def summary(self):
+        """
+        Return a dictionary summarizing the recorded latencies in
+        milliseconds.
+        """
+        return {"games": self.games, **summarize(self.latencies)}
+
+
+def summarize(latencies):
+    """
+    Return the count, mean, median, 99th percentile and maximum of
+    `latencies`, a list of seconds, in milliseconds.
+    """
+    if len(latencies) == 0:
+        return {"moves": 0}
+    ordered = sorted(latencies)
+    return {
+        "moves": len(ordered),
+        "mean_ms": 1000 * statistics.fmean(ordered),
+        "p50_ms": 1000 * ordered[len(ordered) // 2],
+        "p99_ms": 1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "max_ms": 1000 * ordered[-1],
+    }
+
+
+async def serve(ai, piles, host=HOST, port=PORT, unix=None, delay=0):
+    """
+    Serve games against `ai`, starting with piles `piles`, until
+    cancelled. Every connection shares the same AI, which only
+    chooses greedy moves and is never updated.
+    """
+    metrics = Metrics()
+
+    async def handle(reader, writer):
+        await play_connection(ai, piles, delay, metrics, reader, writer)
+
+    if unix:
+        server = await asyncio.start_unix_server(handle, path=unix)
+    else:
+        server = await asyncio.start_server(handle, host, port)
+    print(f"Serving on {unix or f'{host}:{port}'}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+async def play_connection(ai, piles, delay, metrics, reader, writer):
+    """
+    Play games with one client until it quits or disconnects.
+    """
+    game = None
+    human_player = None
+
+    def send(*words):
+        writer.write((" ".join(str(word) for word in words) + "\n").encode())
+
+    async def ai_turn():
+        """
+        Let the AI move if it is its turn, then report the outcome.
+        """
+        if game.winner is None and game.player != human_player:
+            await asyncio.sleep(delay)
+            start = time.perf_counter()
+            pile, count = ai.choose_action(game.piles, epsilon=False)
+            metrics.latencies.append(time.perf_counter() - start)
+            game.move((pile, count))
+            send("AI", pile, count)
+            send("PILES", *game.piles)
+        if game.winner is not None:
+            send("WINNER", "HUMAN" if game.winner == human_player else "AI")
+        else:
+            send("TURN")
+
+    try:
+        while True:
+            # Flush replies, including errors, before reading on
+            await writer.drain()
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                command, *arguments = line.decode().split() or [""]
+            except UnicodeDecodeError:
+                send("ERROR", "Commands must be UTF-8")
+                continue
+            command = command.upper()
+
+            if command == "NEW":
+                try:
+                    player = int(arguments[0]) if arguments else random.randint(0, 1)
+                except ValueError:
+                    player = None
+                if player not in (0, 1):
+                    send("ERROR", "Player must be 0 or 1")
+                    continue
+                human_player = player
+                game = Nim(piles)
+                metrics.games += 1
+                send("PILES", *game.piles)
+                await ai_turn()
+
+            elif command == "MOVE":
+                if game is None or game.winner is not None:
+                    send("ERROR", "No game in progress")
+                    continue
+                try:
+                    pile, count = (int(argument) for argument in arguments)
+                except ValueError:
+                    send("ERROR", "Usage: MOVE pile count")
+                    continue
+                if (pile, count) not in Nim.available_actions(game.piles):
+                    send("ERROR", "Invalid move")
+                    continue
+                game.move((pile, count))
+                send("PILES", *game.piles)
+                await ai_turn()
+
+            elif command == "STATS":
+                send("STATS", json.dumps(metrics.summary()))
+
+            elif command == "QUIT":
+                break
+
+            else:
+                send("ERROR", f"Unknown command {command}")
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def simulate_clients(clients, games, host=HOST, port=PORT, unix=None, seed=None):
+    """
+    Connect `clients` simulated players at once, each playing `games`
+    games of random legal moves, and return the round-trip latency of
+    their moves and the server's own statistics.
+    """
+    rng = random.Random(seed)
+    seeds = [rng.random() for _ in range(clients)]
+    results = await asyncio.gather(*(
+        simulate_client(games, host, port, unix, random.Random(client_seed))
+        for client_seed in seeds
+    ))
+
+    latencies = [latency for client, _ in results for latency in client]
+    wins = sum(human_wins for _, human_wins in results)
+
+    # Ask the server for its view of the AI's latency
+    reader, writer = await connect(host, port, unix)
+    writer.write(b"STATS\n")
+    await writer.drain()
+    server_stats = json.loads((await reader.readline()).decode().split(" ", 1)[1])
+    writer.close()
+
+    return {
+        "clients": clients,
+        "games": clients * games,
+        "human_wins": wins,
+        "round_trip": summarize(latencies),
+        "server": server_stats,
+    }
+
+
+async def simulate_client(games, host, port, unix, rng):
+    """
+    Play `games` games of random legal moves, and return the round-trip
+    latency of each move and the number of games won.
+    """
+    reader, writer = await connect(host, port, unix)
+    latencies = []
+    wins = 0
+
+    for _ in range(games):
+        writer.write(b"NEW\n")
+        await writer.drain()
+        piles = None
+        start = None
+        while True:
+            words = (await reader.readline()).decode().split()
+            if words[0] == "PILES":
+                piles = [int(word) for word in words[1:]]
+            elif words[0] == "WINNER":
+                wins += words[1] == "HUMAN"
+                break
+            elif words[0] == "TURN":
+                pile, count = rng.choice(sorted(Nim.available_actions(piles)))
+                start = time.perf_counter()
+                writer.write(f"MOVE {pile} {count}\n".encode())
+                await writer.drain()
+            elif words[0] == "AI" and start is not None:
+                latencies.append(time.perf_counter() - start)
+                start = None
+            elif words[0] == "ERROR":
+                raise RuntimeError(" ".join(words[1:]))
+
+    writer.write(b"QUIT\n")
+    await writer.drain()
+    writer.close()
+    return latencies, wins
+
+
+async def connect(host, port, unix):
+    if unix:
+        return await asyncio.open_unix_connection(unix)
+    return await asyncio.open_connection(host, port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from pagerank import (
+    DAMPING, SAMPLES, SOLVERS, Graph, crawl, crawl_graph, iterate_pagerank,
+    out_of_core_pagerank, power_iterate, sample_pagerank, save_edge_file
+)
+
+# Graph models that can be generated
+MODELS = ["erdos-renyi", "power-law"]
+
+# Largest graphs to run the dictionary-based engines on (sampling
+# costs O(N) per sample), and to write out as HTML corpora
+PYTHON_LIMIT = 10 ** 4
+CORPUS_LIMIT = 10 ** 5
+
+# Tolerance of the reference solution
+REFERENCE_TOLERANCE = 1e-12
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the PageRank engines on synthetic graphs."
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10 ** 3, 10 ** 4, 10 ** 5],
+        help="numbers of pages to generate"
+    )
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=MODELS)
+    parser.add_argument("--degree", type=float, default=8, help="average links per page")
+    parser.add_argument("--dangling", type=float, default=0.1, help="fraction of pages with no links")
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--python-limit", type=int, default=PYTHON_LIMIT)
+    parser.add_argument("--corpus-limit", type=int, default=CORPUS_LIMIT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write JSON results to")
+    args = parser.parse_args()
+
+    results = []
+    for model in args.models:
+        for n in args.sizes:
+            graph = generate(model, n, args.degree, args.dangling, args.seed)
+            print(f"{model}, {n} pages, {len(graph.indices)} links", file=sys.stderr)
+            for result in benchmark(graph, args):
+                result.update(model=model, pages=n, links=len(graph.indices))
+                print(f"  {result['engine']}: {result['seconds']:.3f}s", file=sys.stderr)
+                results.append(result)
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "damping": DAMPING,
+        "degree": args.degree,
+        "dangling": args.dangling,
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+def generate(model, n, degree, dangling, seed):
+    """
+    Return a random `Graph` of `n` pages named "0.html", "1.html", ...
+
+    In the "erdos-renyi" model, links point to pages chosen uniformly.
+    In the "power-law" model, both the number of links on a page and
+    the popularity of link targets follow power laws. In both, a
+    `dangling` fraction of pages have no links, and the remaining
+    pages have `degree` links on average.
+    """
+    rng = np.random.default_rng(seed)
+    linking = rng.random(n) >= dangling
+    if model == "erdos-renyi":
+        out_degree = rng.poisson(degree, size=n)
+        targets = rng.integers(n, size=out_degree.sum())
+    elif model == "power-law":
+        out_degree = np.minimum(rng.zipf(2.0, size=n), n - 1)
+        out_degree = np.round(out_degree * degree / out_degree.mean()).astype(np.int64)
+        popularity = 1 / np.arange(1, n + 1) ** 0.8
+        targets = rng.choice(
+            rng.permutation(n), size=out_degree.sum(), p=popularity / popularity.sum()
+        )
+    else:
+        raise ValueError(f"Unknown model: {model}")
+
+    sources = np.repeat(np.arange(n), out_degree)
+    keep = linking[sources] & (sources != targets)
+
+    # Sorting unique (source, target) keys drops duplicate links and
+    # leaves them grouped by source, as in CSR form
+    keys = np.unique(sources[keep].astype(np.int64) * n + targets[keep])
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(keys // n, minlength=n))
+    pages = [f"{i}.html" for i in range(n)]
+    return Graph(pages, indptr, keys % n)
+
+
+def write_corpus(graph, directory):
+    """
+    Write `graph` to `directory` as one HTML file per page.
+    """
+    for i, page in enumerate(graph.pages):
+        links = "".join(
+            f'<a href="{graph.pages[j]}">{graph.pages[j]}</a>\n'
+            for j in graph.links(i)
+        )
+        with open(os.path.join(directory, page), "w") as f:
+            f.write(f"<!DOCTYPE html>\n<html>\n<body>\n{links}</body>\n</html>\n")
+
+
+def benchmark(graph, args):
+    """
+    Run every engine that applies to the size of `graph`, and return
+    a list with a result dictionary for each.
+
+    Each case is a function of an iteration callback that returns
+    PageRank values, or `None` for the crawlers.
+    """
+    n = len(graph)
+    reference = power_iterate(graph, DAMPING, REFERENCE_TOLERANCE)
+    cases = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        if n <= args.corpus_limit:
+            corpus_path = os.path.join(directory, "corpus")
+            os.mkdir(corpus_path)
+            write_corpus(graph, corpus_path)
+            cases.append(("crawl-graph", lambda callback: (
+                crawl_graph(corpus_path) and None
+            )))
+            cases.append(("crawl", lambda callback: (
+                crawl(corpus_path) and None
+            )))
+
+        if n <= args.python_limit:
+            corpus = graph.to_corpus()
+            cases.append(("sample-python", lambda callback: sample_pagerank(
+                corpus, DAMPING, args.samples
+            )))
+            cases.append(("iterate-python", lambda callback: iterate_pagerank(
+                corpus, DAMPING
+            )))
+
+        cases.append(("sample-walkers", lambda callback: sample_pagerank(
+            graph, DAMPING, args.samples, walkers=1024, seed=args.seed
+        )))
+        for name, solver in SOLVERS.items():
+            cases.append((f"sparse-{name}", lambda callback, solver=solver: (
+                solver(graph, DAMPING, callback=callback)
+            )))
+
+        edge_path = os.path.join(directory, "edges")
+        save_edge_file(edge_path, graph.pages, (
+            [graph.pages[j] for j in graph.links(i)] for i in range(n)
+        ))
+        cases.append(("out-of-core", lambda callback: out_of_core_pagerank(
+            edge_path, DAMPING, callback=callback
+        )))
+
+        return [run_case(name, case, graph, reference) for name, case in cases]
+
+
+def run_case(name, case, graph, reference):
+    """
+    Run `case` in a child process, and return its wall time, number
+    of iterations, peak memory and L1 error against `reference`.
+
+    The child is forked, so it shares the benchmark's graph; its
+    memory is reported both as a peak and as growth over that.
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_child, args=(case, graph, reference, sender))
+    process.start()
+    sender.close()
+    result = receiver.recv()
+    process.join()
+    result["engine"] = name
+    return result
+
+
+def _run_child(case, graph, reference, sender):
+
+    # Time building the transition matrix as part of each engine
+    graph._matrix = None
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    iterations = []
+
+    start = time.perf_counter()
+    output = case(lambda iteration, residual: iterations.append(residual))
+    seconds = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Compare PageRank values with the reference solution
+    error = None
+    if isinstance(output, dict):
+        ranks = np.array([output.get(page, 0) for page in graph.pages])
+        error = float(np.abs(ranks - reference).sum())
+    elif isinstance(output, np.ndarray):
+        error = float(np.abs(output - reference).sum())
+
+    sender.send({
+        "seconds": seconds,
+        "iterations": len(iterations) or None,
+        # Linux reports `ru_maxrss` in kilobytes
+        "peak_rss_mb": peak_rss / 1024,
+        "added_rss_mb": (peak_rss - start_rss) / 1024,
+        "l1_error": error,
+    })
+    sender.close()
+
+
+if __name__ == "__main__":
+    main()
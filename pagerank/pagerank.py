@@ -1,16 +1,78 @@
+import argparse
+import json
+import mmap
 import os
+import posixpath
 import random
 import re
-import sys
+
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
 
 DAMPING = 0.85
 SAMPLES = 10000
 
+# Convergence settings for the sparse engine
+TOLERANCE = 1e-6
+MAX_ITERATIONS = 1000
+
+# Number of power iterations between extrapolation steps
+EXTRAPOLATION_PERIOD = 10
+
+# Number of adaptive iterations between full steps over every page
+ADAPTIVE_CHECK_PERIOD = 10
+
+# Matches the target of each link in an HTML page
+LINK_PATTERN = re.compile(rb"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# Pages read by each task when crawling, and tasks queued per worker
+READ_CHUNK = 64
+READ_AHEAD = 4
+
+# Version of the on-disk graph cache format
+CACHE_VERSION = 1
+
+# Default memory budget, in bytes, for out-of-core iteration
+MEMORY_BUDGET = 256 * 2 ** 20
+
+# Settings for parallel sampling
+WALKERS = 1024
+BATCHES = 64
+
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
+    parser = argparse.ArgumentParser(description="Rank the pages of a corpus.")
+    parser.add_argument("corpus")
+    parser.add_argument(
+        "--cache", help="directory in which to cache the crawled link graph"
+    )
+    parser.add_argument(
+        "--out-of-core", metavar="DIR",
+        help="stream the link graph through DIR instead of holding it in memory"
+    )
+    parser.add_argument(
+        "--memory", type=int, default=MEMORY_BUDGET // 2 ** 20, metavar="MB",
+        help="memory budget for out-of-core iteration"
+    )
+    args = parser.parse_args()
+
+    if args.out_of_core:
+        write_edge_file(args.corpus, args.out_of_core)
+        ranks = out_of_core_pagerank(
+            args.out_of_core, DAMPING, args.memory * 2 ** 20
+        )
+        print(f"PageRank Results from Out-of-Core Iteration")
+        for page in sorted(ranks):
+            print(f"  {page}: {ranks[page]:.4f}")
+        return
+
+    corpus = crawl_graph(args.corpus, cache=args.cache).to_corpus()
     ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
@@ -27,25 +89,237 @@ def crawl(directory):
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
     """
-    pages = dict()
+    return crawl_graph(directory).to_corpus()
 
-    # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
 
-    # Only include links to other pages in the corpus
-    for filename in pages:
-        pages[filename] = set(
-            link for link in pages[filename]
-            if link in pages
+def crawl_graph(directory, workers=None, processes=False, cache=None):
+    """
+    Parse a directory of HTML pages, including its subdirectories,
+    and return the links between them as a `Graph`.
+
+    Pages are named by their path relative to `directory`, and links
+    are resolved relative to the page they appear on. Files are read
+    by a pool of `workers` threads, or processes if `processes` is
+    true, and each page's links are added to the graph as soon as
+    they are read.
+
+    If `cache` is set, the graph is saved to that directory, and later
+    crawls only re-read pages whose modification time or size changed.
+    """
+    pages = sorted(find_pages(directory))
+    if cache is None:
+        links = read_all_links(directory, pages, workers, processes)
+        return build_graph(pages, links)
+
+    stats = [os.stat(os.path.join(directory, page)) for page in pages]
+    mtimes = np.array([stat.st_mtime_ns for stat in stats], dtype=np.int64)
+    sizes = np.array([stat.st_size for stat in stats], dtype=np.int64)
+    cached = load_graph_cache(cache, directory)
+
+    # Reuse the cached graph outright if no page has changed
+    if (
+        cached is not None
+        and cached["pages"].tolist() == pages
+        and np.array_equal(cached["mtimes"], mtimes)
+        and np.array_equal(cached["sizes"], sizes)
+    ):
+        return Graph(pages, cached["indptr"], cached["indices"])
+
+    # Otherwise read only pages that are new or changed
+    reusable = dict()
+    if cached is not None:
+        for k, page in enumerate(cached["pages"].tolist()):
+            reusable[page] = (cached["mtimes"][k], cached["sizes"][k], k)
+    stale = [
+        page for page, mtime, size in zip(pages, mtimes, sizes)
+        if reusable.get(page, (None, None))[:2] != (mtime, size)
+    ]
+    parsed = dict(zip(
+        stale, read_all_links(directory, stale, workers, processes)
+    ))
+    links = []
+    for page in pages:
+        if page in parsed:
+            links.append(parsed[page])
+        else:
+            k = reusable[page][2]
+            start, end = cached["link_indptr"][k:k + 2]
+            links.append(set(
+                cached["link_names"][cached["link_ids"][start:end]].tolist()
+            ))
+
+    graph = build_graph(pages, links)
+    save_graph_cache(cache, directory, graph, mtimes, sizes, links)
+    return graph
+
+
+def read_all_links(directory, pages, workers=None, processes=False):
+    """
+    Yield the links of each page in `pages`, in order, reading the
+    pages with a pool of `workers` threads or processes.
+
+    Pages are read in chunks, with only a few chunks per worker
+    submitted ahead of the one being yielded, so that the links held
+    in memory do not grow with the size of the corpus.
+    """
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    window = READ_AHEAD * (workers or os.cpu_count() or 1)
+    read_chunk = partial(read_links_chunk, directory)
+    pending = deque()
+
+    with pool(max_workers=workers) as executor:
+        for start in range(0, len(pages), READ_CHUNK):
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+            pending.append(
+                executor.submit(read_chunk, pages[start:start + READ_CHUNK])
+            )
+        while pending:
+            yield from pending.popleft().result()
+
+
+def read_links_chunk(directory, pages):
+    """
+    Return a list of the links of each page in `pages`.
+    """
+    return [read_links(directory, page) for page in pages]
+
+
+def build_graph(pages, links):
+    """
+    Return a `Graph` of `pages`, given an iterable over the set of
+    links of each page in the same order.
+    """
+    index = {page: i for i, page in enumerate(pages)}
+    indptr = array("q", [0])
+    indices = array("i")
+
+    for page_links in links:
+
+        # Only include links to other pages in the corpus
+        indices.extend(sorted(set(
+            index[link] for link in page_links if link in index
+        )))
+        indptr.append(len(indices))
+
+    return Graph(pages, indptr, indices)
+
+
+def load_graph_cache(cache, directory):
+    """
+    Return the arrays saved in `cache` for `directory`, memory-mapped
+    from disk, or `None` if there is no usable cache.
+    """
+    try:
+        with open(os.path.join(cache, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        meta.get("version") != CACHE_VERSION
+        or meta.get("directory") != os.path.abspath(directory)
+    ):
+        return None
+
+    arrays = dict()
+    try:
+        for name in meta["arrays"]:
+            arrays[name] = np.load(
+                os.path.join(cache, f"{name}.npy"), mmap_mode="r"
+            )
+    except (OSError, ValueError):
+        return None
+    return arrays
+
+
+def save_graph_cache(cache, directory, graph, mtimes, sizes, links):
+    """
+    Save `graph` to the `cache` directory along with the modification
+    time, size and links of each page, so unchanged pages need not be
+    read again.
+    """
+    os.makedirs(cache, exist_ok=True)
+    meta_path = os.path.join(cache, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    # Store every page's links, including links to pages not (yet)
+    # in the corpus, as indices into a table of distinct link names
+    link_index = dict()
+    link_indptr = array("q", [0])
+    link_ids = array("i")
+    for page_links in links:
+        link_ids.extend(
+            link_index.setdefault(link, len(link_index))
+            for link in sorted(page_links)
         )
+        link_indptr.append(len(link_ids))
+
+    arrays = {
+        "pages": np.array(graph.pages, dtype=str),
+        "mtimes": mtimes,
+        "sizes": sizes,
+        "indptr": graph.indptr,
+        "indices": graph.indices,
+        "link_names": np.array(list(link_index), dtype=str),
+        "link_indptr": np.frombuffer(link_indptr, dtype=np.int64),
+        "link_ids": np.frombuffer(link_ids, dtype=np.int32),
+    }
+    for name, values in arrays.items():
+
+        # Replace files rather than overwrite them, since earlier
+        # graphs may still have the old arrays mapped into memory
+        path = os.path.join(cache, f"{name}.npy")
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, values)
+        os.replace(path + ".tmp", path)
+
+    # Write the metadata last, so a partly written cache is never used
+    with open(meta_path, "w") as f:
+        json.dump({
+            "version": CACHE_VERSION,
+            "directory": os.path.abspath(directory),
+            "arrays": list(arrays),
+        }, f)
+
+
+def find_pages(directory, prefix=""):
+    """
+    Yield the path, relative to `directory`, of every HTML file
+    in `directory` and its subdirectories.
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            name = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                yield from find_pages(entry.path, name + "/")
+            elif entry.name.endswith(".html") and entry.is_file():
+                yield name
 
-    return pages
+
+def read_links(directory, page):
+    """
+    Return the pages linked to by `page`, other than itself,
+    as paths relative to `directory`.
+    """
+    with open(os.path.join(directory, page), "rb") as f:
+        try:
+            contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return []
+        with contents:
+            hrefs = LINK_PATTERN.findall(contents)
+
+    base = posixpath.dirname(page)
+    links = set()
+    for href in hrefs:
+        link = posixpath.normpath(
+            posixpath.join(base, href.decode("utf-8", errors="replace"))
+        )
+        if link != page:
+            links.add(link)
+    return links
 
 
 def transition_model(corpus, page, damping_factor):
@@ -74,15 +348,36 @@ def transition_model(corpus, page, damping_factor):
     raise NotImplementedError
 
 
-def sample_pagerank(corpus, damping_factor, n):
+def sample_pagerank(corpus, damping_factor, n, walkers=None, seed=None,
+                    processes=None):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
 
+    If `walkers` is set, the samples are instead drawn by that many
+    independent random surfers advanced together in batched NumPy
+    steps, each step costing O(1) per surfer. `seed` seeds their
+    random number generator.
+
+    If `processes` is set, the samples are split across a pool of
+    that many processes; see `parallel_sample_pagerank`.
+
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
+    if processes is not None:
+        ranks, _ = parallel_sample_pagerank(
+            corpus, damping_factor, n, walkers or WALKERS, seed, processes
+        )
+        return ranks
+
+    if walkers is not None:
+        graph = corpus if isinstance(corpus, Graph) else Graph.from_corpus(corpus)
+        rng = np.random.default_rng(seed)
+        counts = walk(graph, damping_factor, n, walkers, rng)
+        return graph.to_dict(counts / counts.sum())
+
     page = random.choice(list(corpus.keys()))
     result = {key: 0 for key in corpus.keys()}
     result[page] += 1
@@ -98,6 +393,109 @@ def sample_pagerank(corpus, damping_factor, n):
     return result
     raise NotImplementedError
 
+def parallel_sample_pagerank(corpus, damping_factor, n, walkers=WALKERS,
+                             seed=None, processes=None):
+    """
+    Return PageRank estimates and their standard errors from `n`
+    samples split across a pool of `processes` worker processes.
+
+    The samples are divided into `BATCHES` equal batches, each walked
+    with its own random stream spawned from `seed`, and the visit
+    counts are merged. Since the batches do not depend on the number
+    of processes, the result for a given `seed` is the same however
+    many processes are used. The standard error of each page is
+    estimated from the spread of its rank across batches.
+
+    Return a pair of dictionaries mapping page names to their
+    estimated PageRank value and to its standard error.
+    """
+    graph = corpus if isinstance(corpus, Graph) else Graph.from_corpus(corpus)
+    batches = min(BATCHES, n)
+    sizes = [n // batches + (1 if k < n % batches else 0) for k in range(batches)]
+    seeds = np.random.SeedSequence(seed).spawn(batches)
+    tasks = [
+        (damping_factor, size, walkers, batch_seed)
+        for size, batch_seed in zip(sizes, seeds)
+    ]
+
+    if processes == 1:
+        _init_sample_worker(graph)
+        results = list(map(_sample_batch, tasks))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_sample_worker,
+            initargs=(graph,)
+        ) as executor:
+            results = list(executor.map(_sample_batch, tasks))
+
+    counts = np.array(results, dtype=np.float64)
+    estimates = counts / counts.sum(axis=1, keepdims=True)
+    ranks = counts.sum(axis=0) / counts.sum()
+    if batches > 1:
+        errors = estimates.std(axis=0, ddof=1) / np.sqrt(batches)
+    else:
+        errors = np.full(len(graph), np.nan)
+
+    return graph.to_dict(ranks), graph.to_dict(errors)
+
+
+# Graph shared by the batches run in a sampling worker process
+_sample_graph = None
+
+
+def _init_sample_worker(graph):
+    global _sample_graph
+    _sample_graph = graph
+
+
+def _sample_batch(task):
+    damping_factor, n, walkers, seed = task
+    rng = np.random.default_rng(seed)
+    return walk(_sample_graph, damping_factor, n, walkers, rng)
+
+
+def walk(graph, damping_factor, n, walkers, rng):
+    """
+    Advance `walkers` random surfers over `graph` in lockstep until
+    at least `n` pages have been sampled in total, and return the
+    number of times each page was visited.
+
+    Each surfer starts on a page chosen at random. On every step it
+    follows a random link with probability `damping_factor`, and
+    otherwise (or if its page has no links) jumps to any page.
+    Once `n` pages are sampled, each surfer keeps following links
+    until its next jump, since cutting paths short would over-count
+    the pages near their random starts. The visit counts should
+    therefore be normalized by their sum rather than by `n`.
+    """
+    total_pages = len(graph)
+    walkers = max(1, min(walkers, n))
+    counts = np.zeros(total_pages, dtype=np.int64)
+
+    pages = rng.integers(total_pages, size=walkers)
+    active = np.ones(walkers, dtype=bool)
+    sampled = 0
+    while True:
+        counts += np.bincount(pages[active], minlength=total_pages)
+        sampled += np.count_nonzero(active)
+
+        # Pick a link uniformly by offset into the page's slice of `indices`
+        degree = graph.out_degree[pages]
+        follow = (rng.random(walkers) < damping_factor) & (degree > 0)
+        offsets = (rng.random(walkers) * degree).astype(np.int64)
+        next_pages = rng.integers(total_pages, size=walkers)
+        next_pages[follow] = graph.indices[
+            graph.indptr[pages[follow]] + offsets[follow]
+        ]
+        pages = next_pages
+
+        if sampled >= n:
+            active &= follow
+            if not active.any():
+                return counts
+
+
 def weighted_choice(choices):
     total = sum(choices.values())
     rand_val = random.uniform(0, total)
@@ -122,18 +520,20 @@ def iterate_pagerank(corpus, damping_factor):
     next_probability = {key: 1 / total_pages for key in corpus.keys()}
     reverse_corpus = {key: set() for key in corpus.keys()}
 
-    for page in corpus:
-        if len(corpus[page]) == 0:
-            corpus[page] = set(corpus.keys())
-    
+    # A page with no links is treated as linking to every page,
+    # including itself, so its rank is spread evenly on each round
+    dangling_pages = [page for page in corpus if len(corpus[page]) == 0]
+
     for page in corpus:
         for linked_page in corpus[page]:
             reverse_corpus[linked_page].add(page)
 
     while not all(abs(prev_probability[page] - next_probability[page]) <= 0.001 for page in prev_probability):
         prev_probability.update(next_probability)
+        dangling_rank = sum(prev_probability[page] for page in dangling_pages)
         for page in corpus:
             next_probability[page] = ((1 - damping_factor) / total_pages)
+            next_probability[page] += damping_factor * dangling_rank / total_pages
             for i_page in reverse_corpus[page]:
                 next_probability[page] += damping_factor * prev_probability[i_page] / len(corpus[i_page])
 
@@ -141,5 +541,586 @@ def iterate_pagerank(corpus, damping_factor):
     raise NotImplementedError
 
 
+class Graph():
+    """
+    Link graph of a corpus compiled to integer page indices.
+
+    Each graph has
+        - `pages`: a list of page names, where `pages[i]` is page `i`
+        - `index`: a dictionary mapping page names to their index
+        - `indptr`, `indices`: the outgoing links in CSR form, so the
+          pages linked to by page `i` are `indices[indptr[i]:indptr[i + 1]]`
+        - `out_degree`: the number of links on each page
+        - `dangling`: a boolean mask of pages with no links
+    """
+
+    def __init__(self, pages, indptr, indices):
+        self.pages = list(pages)
+        self.index = {page: i for i, page in enumerate(self.pages)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.out_degree = np.diff(self.indptr)
+        self.dangling = self.out_degree == 0
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.pages)
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Graph.from_corpus(corpus) compiles a corpus dictionary, as
+        returned by `crawl`, into a `Graph`. Pages are numbered in
+        sorted order. The corpus is not modified.
+        """
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        indptr = np.zeros(len(pages) + 1, dtype=np.int64)
+        indices = []
+        for i, page in enumerate(pages):
+            links = sorted(index[link] for link in corpus[page])
+            indices.extend(links)
+            indptr[i + 1] = len(indices)
+        return cls(pages, indptr, indices)
+
+    def to_corpus(self):
+        """
+        Return the graph as a corpus dictionary mapping each page to
+        the set of pages it links to.
+        """
+        return {
+            page: set(self.pages[j] for j in self.links(i))
+            for i, page in enumerate(self.pages)
+        }
+
+    def links(self, i):
+        """
+        Return the indices of the pages linked to by page `i`.
+        """
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def transition_matrix(self):
+        """
+        Return the sparse matrix `M` where `M[j, i]` is the probability
+        of following a link from page `i` to page `j`. Columns of
+        dangling pages are all zero; callers redistribute their rank.
+        """
+        if self._matrix is None:
+            n = len(self.pages)
+            weights = np.repeat(
+                1 / np.maximum(self.out_degree, 1), self.out_degree
+            )
+            matrix = scipy.sparse.csr_matrix(
+                (weights, self.indices, self.indptr), shape=(n, n)
+            )
+            self._matrix = matrix.T.tocsr()
+        return self._matrix
+
+    def to_dict(self, ranks):
+        """
+        Return a dictionary mapping each page name to its value in `ranks`.
+        """
+        return {page: float(rank) for page, rank in zip(self.pages, ranks)}
+
+
+def power_iterate(graph, damping_factor, tolerance=TOLERANCE,
+                  max_iterations=MAX_ITERATIONS, ranks=None, callback=None):
+    """
+    Return the PageRank vector of `graph` by power (Jacobi) iteration,
+    starting from `ranks` if given and from uniform ranks otherwise.
+
+    Iteration stops once the L1 distance between two successive rank
+    vectors is at most `tolerance`, or after `max_iterations` rounds.
+    If `callback` is given, it is called with the iteration number
+    and that distance after each round.
+    """
+    ranks = _start_ranks(graph, ranks)
+    for iteration in range(1, max_iterations + 1):
+        new_ranks = _power_step(graph, damping_factor, ranks)
+        residual = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if callback is not None:
+            callback(iteration, residual)
+        if residual <= tolerance:
+            break
+
+    return ranks
+
+
+def gauss_seidel_iterate(graph, damping_factor, tolerance=TOLERANCE,
+                         max_iterations=MAX_ITERATIONS, ranks=None,
+                         callback=None):
+    """
+    Return the PageRank vector of `graph` by Gauss-Seidel iteration,
+    where each page's new rank is used by later pages in the same round.
+
+    This solves the linear system `(I - damping_factor * M) x = 1 / N`,
+    whose solution, once normalized, is the PageRank vector with rank
+    on dangling pages spread evenly. Each round is a single sparse
+    triangular solve. Arguments are as for `power_iterate`.
+    """
+    n = len(graph)
+    ranks = _start_ranks(graph, ranks)
+    matrix = graph.transition_matrix()
+    lower = scipy.sparse.tril(matrix, k=-1, format="csr")
+    upper = scipy.sparse.triu(matrix, k=0, format="csr")
+    identity = scipy.sparse.identity(n, format="csr")
+    system = (identity - damping_factor * lower).tocsr()
+
+    solution = ranks
+    for iteration in range(1, max_iterations + 1):
+        right = damping_factor * (upper @ solution) + (1 - damping_factor) / n
+        solution = scipy.sparse.linalg.spsolve_triangular(
+            system, right, lower=True
+        )
+        new_ranks = solution / solution.sum()
+        residual = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if callback is not None:
+            callback(iteration, residual)
+        if residual <= tolerance:
+            break
+
+    return ranks
+
+
+def extrapolation_iterate(graph, damping_factor, tolerance=TOLERANCE,
+                          max_iterations=MAX_ITERATIONS, ranks=None,
+                          callback=None, method="aitken"):
+    """
+    Return the PageRank vector of `graph` by power iteration, jumping
+    ahead every `EXTRAPOLATION_PERIOD` rounds by extrapolating from the
+    last few iterates.
+
+    `method` is "aitken" for Aitken's delta-squared extrapolation of
+    each page, or "quadratic" for quadratic extrapolation, which fits
+    the last four iterates. Other arguments are as for `power_iterate`.
+    """
+    ranks = _start_ranks(graph, ranks)
+    history = [ranks]
+
+    for iteration in range(1, max_iterations + 1):
+        new_ranks = _power_step(graph, damping_factor, ranks)
+        residual = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        history = history[-3:] + [ranks]
+        if callback is not None:
+            callback(iteration, residual)
+        if residual <= tolerance:
+            break
+
+        if iteration % EXTRAPOLATION_PERIOD == 0 and len(history) == 4:
+            if method == "aitken":
+                ranks = _aitken(*history[-3:])
+            else:
+                ranks = _quadratic_extrapolation(*history)
+            history = [ranks]
+
+    return ranks
+
+
+def adaptive_iterate(graph, damping_factor, tolerance=TOLERANCE,
+                     max_iterations=MAX_ITERATIONS, ranks=None,
+                     callback=None):
+    """
+    Return the PageRank vector of `graph` by adaptive power iteration,
+    which stops updating pages once they have converged.
+
+    A page is frozen once its rank changes by at most `tolerance / N`
+    in a round, and later rounds only recompute the remaining pages.
+    Frozen pages can still drift as their neighbors change, so every
+    `ADAPTIVE_CHECK_PERIOD` rounds, and whenever the active pages have
+    converged, a full power step is taken instead: it unfreezes every
+    page whose rank changed by more than `tolerance / N`, and iteration
+    only stops once the change over all pages is at most `tolerance`,
+    as in `power_iterate`. Other arguments are as for `power_iterate`.
+    """
+    n = len(graph)
+    threshold = tolerance / n
+    ranks = _start_ranks(graph, ranks)
+    matrix = graph.transition_matrix()
+    active = np.arange(n)
+    rows = matrix
+    full = True
+
+    for iteration in range(1, max_iterations + 1):
+        if full:
+            new_ranks = _power_step(graph, damping_factor, ranks)
+            change = np.abs(new_ranks - ranks)
+            ranks = new_ranks
+            residual = change.sum()
+            if callback is not None:
+                callback(iteration, residual)
+            if residual <= tolerance:
+                break
+            active = np.flatnonzero(change > threshold)
+            rows = matrix[active]
+            full = False
+            continue
+
+        dangling_rank = ranks[graph.dangling].sum()
+        updated = damping_factor * (rows @ ranks)
+        updated += ((1 - damping_factor) + damping_factor * dangling_rank) / n
+        change = np.abs(updated - ranks[active])
+        ranks = ranks.copy()
+        ranks[active] = updated
+        residual = change.sum()
+        if callback is not None:
+            callback(iteration, residual)
+
+        # Check every page once the active ones have converged
+        if residual <= tolerance or iteration % ADAPTIVE_CHECK_PERIOD == 0:
+            full = True
+            continue
+
+        # Drop converged pages once enough of them have accumulated
+        # to be worth slicing a smaller matrix
+        converged = change <= threshold
+        if converged.sum() > len(active) // 10:
+            active = active[~converged]
+            rows = matrix[active]
+
+    return ranks / ranks.sum()
+
+
+# Solvers that can be chosen in `sparse_pagerank`
+SOLVERS = {
+    "power": power_iterate,
+    "gauss-seidel": gauss_seidel_iterate,
+    "aitken": partial(extrapolation_iterate, method="aitken"),
+    "quadratic": partial(extrapolation_iterate, method="quadratic"),
+    "adaptive": adaptive_iterate,
+}
+
+
+def _start_ranks(graph, ranks):
+    if ranks is None:
+        return np.full(len(graph), 1 / len(graph))
+    return ranks
+
+
+def _power_step(graph, damping_factor, ranks):
+    n = len(graph)
+    dangling_rank = ranks[graph.dangling].sum()
+    new_ranks = damping_factor * (graph.transition_matrix() @ ranks)
+    new_ranks += ((1 - damping_factor) + damping_factor * dangling_rank) / n
+    return new_ranks
+
+
+def _aitken(x0, x1, x2):
+    denominator = x2 - 2 * x1 + x0
+    safe = np.abs(denominator) > 1e-15
+    ranks = x2.copy()
+    ranks[safe] -= (x2[safe] - x1[safe]) ** 2 / denominator[safe]
+    return _normalize(ranks)
+
+
+def _quadratic_extrapolation(x0, x1, x2, x3):
+    y = np.column_stack([x1 - x0, x2 - x0])
+    gamma, *_ = np.linalg.lstsq(y, -(x3 - x0), rcond=None)
+    gamma1, gamma2 = gamma
+    ranks = (gamma1 + gamma2 + 1) * x1 + (gamma2 + 1) * x2 + x3
+    return _normalize(ranks)
+
+
+def _normalize(ranks):
+    ranks = np.maximum(ranks, 0)
+    return ranks / ranks.sum()
+
+
+def sparse_pagerank(corpus, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS, solver="power",
+                    callback=None):
+    """
+    Return PageRank values for each page using vectorized iteration
+    over a sparse link matrix.
+
+    `corpus` may be a corpus dictionary or a compiled `Graph`.
+    `solver` names one of `SOLVERS`, and `callback`, if given, is
+    called with the iteration number and L1 residual after each round.
+
+    Return a dictionary where keys are page names, and values are
+    their PageRank value. All PageRank values sum to 1.
+    """
+    graph = corpus if isinstance(corpus, Graph) else Graph.from_corpus(corpus)
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver: {solver}")
+    ranks = SOLVERS[solver](
+        graph, damping_factor, tolerance, max_iterations, callback=callback
+    )
+    return graph.to_dict(ranks)
+
+
+def personalized_pagerank(corpus, seeds, damping_factor, tolerance=TOLERANCE,
+                          max_iterations=MAX_ITERATIONS):
+    """
+    Return personalized PageRank values for many seed sets at once.
+
+    `seeds` is a list of queries, each a set of page names. For each
+    query, the random surfer jumps to one of its seed pages instead of
+    to any page, including when leaving a page with no links. All
+    queries are iterated together, one column each, so every round is
+    a single sparse matrix product. Iteration stops once every column
+    has an L1 residual of at most `tolerance`.
+
+    Return a pair of the list of page names and an array of shape
+    `(len(pages), len(seeds))` whose column `q` holds the PageRank
+    values for query `q`. Each column sums to 1.
+    """
+    graph = corpus if isinstance(corpus, Graph) else Graph.from_corpus(corpus)
+    n = len(graph)
+    matrix = graph.transition_matrix()
+
+    # Column `q` of `teleport` is the jump distribution of query `q`
+    teleport = np.zeros((n, len(seeds)))
+    for q, query in enumerate(seeds):
+        query = set(query)
+        if len(query) == 0:
+            raise ValueError(f"Query {q} has no seed pages")
+        for page in query:
+            if page not in graph.index:
+                raise ValueError(f"Unknown seed page: {page}")
+            teleport[graph.index[page], q] = 1 / len(query)
+
+    ranks = teleport.copy()
+    for _ in range(max_iterations):
+        dangling_rank = ranks[graph.dangling].sum(axis=0)
+        new_ranks = damping_factor * (matrix @ ranks)
+        new_ranks += teleport * ((1 - damping_factor) + damping_factor * dangling_rank)
+        residual = np.abs(new_ranks - ranks).sum(axis=0).max()
+        ranks = new_ranks
+        if residual <= tolerance:
+            break
+
+    return graph.pages, ranks
+
+
+def update_pagerank(corpus, ranks, damping_factor, added=None, removed=None,
+                    local=False, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS):
+    """
+    Return the corpus and PageRank values after an edit, starting from
+    the PageRank values `ranks` computed before it.
+
+    `added` maps pages to sets of links added to them; pages not yet
+    in `corpus` are added. `removed` maps pages to sets of links
+    removed from them, or to `None` to remove the page entirely.
+    `corpus` itself is not modified.
+
+    Iteration starts from the previous ranks, with new pages given an
+    equal share. If `local` is true, only pages whose rank is still
+    off by more than their share of `tolerance` pass on corrections,
+    so small edits touch little more than their neighborhood.
+
+    Return a pair of the edited corpus and a dictionary of its
+    PageRank values.
+    """
+    corpus = apply_diff(corpus, added, removed)
+    graph = Graph.from_corpus(corpus)
+    n = len(graph)
+
+    # Warm start from the previous ranks
+    start = np.array([ranks.get(page, 1 / n) for page in graph.pages])
+    start /= start.sum()
+
+    if local:
+        new_ranks = push_iterate(
+            graph, damping_factor, start, tolerance, max_iterations
+        )
+    else:
+        new_ranks = power_iterate(
+            graph, damping_factor, tolerance, max_iterations, start
+        )
+    return corpus, graph.to_dict(new_ranks)
+
+
+def apply_diff(corpus, added=None, removed=None):
+    """
+    Return a copy of `corpus` with the links in `added` added and the
+    links or pages in `removed` removed, as described in `update_pagerank`.
+    """
+    removed = removed or dict()
+    removed_pages = set(page for page, links in removed.items() if links is None)
+    result = {
+        page: set(links) for page, links in corpus.items()
+        if page not in removed_pages
+    }
+
+    for page, links in (added or dict()).items():
+        result.setdefault(page, set()).update(links)
+    for page, links in removed.items():
+        if links is not None and page in result:
+            result[page] -= links
+
+    # Only include links to other pages in the corpus
+    for page in result:
+        result[page] = set(
+            link for link in result[page]
+            if link in result and link != page
+        )
+
+    return result
+
+
+def push_iterate(graph, damping_factor, ranks, tolerance=TOLERANCE,
+                 max_iterations=MAX_ITERATIONS):
+    """
+    Return the PageRank vector of `graph`, refining the estimate
+    `ranks` by pushing residuals only from pages that need it.
+
+    The residual of a page is how much its rank would change in one
+    round of power iteration. On each round, every page whose residual
+    exceeds `tolerance / N` adds it to its rank and passes it on along
+    its links, so work is proportional to the links of those pages.
+    """
+    n = len(graph)
+    ranks = ranks.copy()
+    threshold = tolerance / n
+
+    # Compute the residual once over the whole graph
+    residual = damping_factor * (graph.transition_matrix() @ ranks)
+    residual += (
+        (1 - damping_factor)
+        + damping_factor * ranks[graph.dangling].sum()
+    ) / n
+    residual -= ranks
+
+    # Residual passed on by dangling pages reaches every page equally,
+    # so it is kept aside until it is large enough to matter
+    spread = 0
+
+    for _ in range(max_iterations):
+        active = np.flatnonzero(np.abs(residual + spread) > threshold)
+        if len(active) == 0:
+            break
+        residual += spread
+        spread = 0
+
+        delta = residual[active]
+        ranks[active] += delta
+        residual[active] = 0
+
+        # Pass each active page's residual on along its links
+        degree = graph.out_degree[active]
+        starts = np.repeat(graph.indptr[active], degree)
+        offsets = np.arange(degree.sum()) - np.repeat(
+            np.cumsum(degree) - degree, degree
+        )
+        targets = graph.indices[starts + offsets]
+        weights = np.repeat(
+            damping_factor * delta / np.maximum(degree, 1), degree
+        )
+        np.add.at(residual, targets, weights)
+        spread += damping_factor * delta[degree == 0].sum() / n
+
+    ranks += residual + spread
+    return ranks / ranks.sum()
+
+
+def write_edge_file(directory, path, workers=None, processes=False):
+    """
+    Crawl `directory` as in `crawl_graph`, writing its links to the
+    `path` directory instead of building a graph in memory.
+
+    Links are appended to `edges.bin` as soon as each page is read, as
+    pairs of 32-bit page indices `(page, linked page)` grouped by page.
+    The page names and the number of links on each page are saved
+    alongside in `pages.npy` and `degree.npy`. The page names and an
+    index of them are held in memory while writing, but the links of
+    only a few pages per worker are.
+    """
+    pages = sorted(find_pages(directory))
+    links = read_all_links(directory, pages, workers, processes)
+    save_edge_file(path, pages, links)
+
+
+def save_edge_file(path, pages, links):
+    """
+    Write the edge file described in `write_edge_file` to `path`,
+    given an iterable over the set of links of each page in `pages`.
+    """
+    os.makedirs(path, exist_ok=True)
+    index = {page: i for i, page in enumerate(pages)}
+    degree = np.zeros(len(pages), dtype=np.int32)
+
+    with open(os.path.join(path, "edges.bin"), "wb") as f:
+        for i, page_links in enumerate(links):
+            targets = sorted(set(
+                index[link] for link in page_links if link in index
+            ))
+            degree[i] = len(targets)
+            edges = np.empty((len(targets), 2), dtype=np.int32)
+            edges[:, 0] = i
+            edges[:, 1] = targets
+            f.write(edges.tobytes())
+
+    np.save(os.path.join(path, "pages.npy"), np.array(pages, dtype=str))
+    np.save(os.path.join(path, "degree.npy"), degree)
+
+
+def out_of_core_pagerank(path, damping_factor, memory=MEMORY_BUDGET,
+                         tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS,
+                         callback=None):
+    """
+    Return PageRank values for each page of the edge file at `path`,
+    written by `write_edge_file`, by power iteration that streams the
+    edges from disk in blocks.
+
+    Only the rank vectors and one block of edges are held in memory,
+    with blocks sized so that together they fit in `memory` bytes.
+    The budget covers the iteration alone: the page names are loaded
+    and the returned dictionary built in full, outside of it.
+    Other arguments are as for `power_iterate`.
+    """
+    degree = np.load(os.path.join(path, "degree.npy"), mmap_mode="r")
+    n = len(degree)
+    edge_path = os.path.join(path, "edges.bin")
+    total_edges = os.path.getsize(edge_path) // 8
+
+    # Resident vectors: link weights, each page's share per link, the
+    # dangling mask, old and new ranks, and the ranks added by a block;
+    # each edge in a block needs its pair and a gathered share
+    resident = n * (8 * 5 + 1)
+    block = (memory - resident) // 16
+    if block < 1:
+        raise ValueError(f"Memory budget too small for {n} pages")
+    block = min(block, max(total_edges, 1))
+
+    weights = 1 / np.maximum(np.asarray(degree, dtype=np.float64), 1)
+    dangling = np.asarray(degree) == 0
+    edges = np.empty((block, 2), dtype=np.int32)
+    ranks = np.full(n, 1 / n)
+
+    with open(edge_path, "rb") as f:
+        for iteration in range(1, max_iterations + 1):
+            dangling_rank = ranks[dangling].sum()
+            new_ranks = np.zeros(n)
+            shares = ranks * weights
+
+            # Stream each block of edges from disk
+            f.seek(0)
+            while True:
+                count = f.readinto(edges) // 8
+                if count == 0:
+                    break
+                new_ranks += np.bincount(
+                    edges[:count, 1],
+                    weights=shares[edges[:count, 0]],
+                    minlength=n
+                )
+
+            new_ranks *= damping_factor
+            new_ranks += ((1 - damping_factor) + damping_factor * dangling_rank) / n
+            residual = np.abs(new_ranks - ranks).sum()
+            ranks = new_ranks
+            if callback is not None:
+                callback(iteration, residual)
+            if residual <= tolerance:
+                break
+
+    pages = np.load(os.path.join(path, "pages.npy"), mmap_mode="r")
+    return {page: float(rank) for page, rank in zip(pages.tolist(), ranks)}
+
+
 if __name__ == "__main__":
     main()